@@ -1,5 +1,7 @@
 from django.urls import path
 
+from core.page_cache import cache_page_for_anonymous
+
 from . import views
 
 app_name = 'about'
@@ -7,14 +9,14 @@ app_name = 'about'
 urlpatterns = [
     path(
         'author/',
-        views.AboutAuthorView.as_view(
-            template_name='about/author.html'),
+        cache_page_for_anonymous('about')(views.AboutAuthorView.as_view(
+            template_name='about/author.html')),
         name='author'
     ),
     path(
         'tech/',
-        views.AboutTechView.as_view(
-            template_name='about/tech.html'),
+        cache_page_for_anonymous('about')(views.AboutTechView.as_view(
+            template_name='about/tech.html')),
         name='tech'
     ),
 ]
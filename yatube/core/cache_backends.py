@@ -0,0 +1,518 @@
+"""Бэкенды кэша: общий для процессов SQLiteCache и двухуровневый кэш.
+
+SQLiteCache - кэш в файле SQLite, общий для всех процессов на одном хосте.
+
+LocMemCache у каждого WSGI-процесса свой, поэтому версии фрагментов
+и суррогатные ключи, увеличенные в одном процессе, не видны в других.
+SQLiteCache хранит данные в одном файле в режиме WAL: читатели не
+блокируют писателя, а incr выполняется одним UPDATE и потому атомарен
+между процессами.
+
+Целые числа хранятся в колонке как есть, чтобы incr работал на стороне
+SQLite; остальные значения сериализуются pickle. Размер кэша
+ограничен OPTIONS['MAX_ENTRIES'] и OPTIONS['MAX_SIZE'] (байты); при
+превышении сначала удаляются просроченные записи, затем давно
+не читавшиеся (LRU).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.functional import cached_property
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_stats
+    SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_stats
+    SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_resize AFTER UPDATE OF size ON cache BEGIN
+    UPDATE cache_stats SET bytes = bytes - OLD.size + NEW.size WHERE id = 0;
+END;
+"""
+
+UPSERT = """
+INSERT INTO cache (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value, expires = excluded.expires,
+    accessed = excluded.accessed, size = excluded.size
+"""
+
+# Время последнего чтения обновляется не чаще раза в столько секунд,
+# чтобы горячие ключи не превращали каждое чтение в запись.
+ACCESS_RESOLUTION = 5
+# Максимум параметров в одном запросе get_many/delete_many.
+CHUNK_SIZE = 500
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = options.get('MAX_SIZE')
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self._path, timeout=self._busy_timeout,
+                                 isolation_level=None)
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('PRAGMA synchronous = NORMAL')
+            db.executescript(SCHEMA)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _encode(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    @staticmethod
+    def _size(key, value):
+        return len(key) + (8 if isinstance(value, int) else len(value))
+
+    def _row(self, key, value, timeout, now):
+        value = self._encode(value)
+        return (key, value, self.get_backend_timeout(timeout), now,
+                self._size(key, value))
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _touch_accessed(self, keys, now):
+        self._db.executemany(
+            'UPDATE cache SET accessed = ? WHERE key = ? AND accessed < ?',
+            [(now, key, now - ACCESS_RESOLUTION) for key in keys],
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        cursor = self._db.execute(
+            UPSERT + ' WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            self._row(key, value, timeout, now) + (now,),
+        )
+        if cursor.rowcount:
+            self._cull()
+        return bool(cursor.rowcount)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        row = self._db.execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires = row
+        if expires is not None and expires <= now:
+            self._db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now))
+            return default
+        self._touch_accessed([key], now)
+        return self._decode(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._db.execute(UPSERT, self._row(key, value, timeout, time.time()))
+        self._cull()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return bool(cursor.rowcount)
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        now = time.time()
+        found = {}
+        names = list(keys)
+        for start in range(0, len(names), CHUNK_SIZE):
+            chunk = names[start:start + CHUNK_SIZE]
+            rows = self._db.execute(
+                'SELECT key, value FROM cache WHERE key IN (%s) '
+                'AND (expires IS NULL OR expires > ?)'
+                % ', '.join('?' * len(chunk)),
+                chunk + [now],
+            )
+            for name, value in rows:
+                found[keys[name]] = self._decode(value)
+        self._touch_accessed(
+            [name for name, key in keys.items() if key in found], now)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = [self._row(self._key(key, version), value, timeout, now)
+                for key, value in data.items()]
+        with self._transaction() as db:
+            db.executemany(UPSERT, rows)
+        self._cull()
+        return []
+
+    def delete_many(self, keys, version=None):
+        names = [self._key(key, version) for key in keys]
+        with self._transaction() as db:
+            db.executemany('DELETE FROM cache WHERE key = ?',
+                           [(name,) for name in names])
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE cache SET value = value + ?, accessed = ? "
+                "WHERE key = ? AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (delta, now, key, now),
+            )
+            if not cursor.rowcount:
+                raise ValueError("Key '%s' not found" % key)
+            return db.execute('SELECT value FROM cache WHERE key = ?',
+                              (key,)).fetchone()[0]
+
+    def clear(self):
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache')
+            db.execute('UPDATE cache_stats SET entries = 0, bytes = 0')
+
+    def _transaction(self):
+        return _Transaction(self._db)
+
+    def _cull(self):
+        entries, size = self._db.execute(
+            'SELECT entries, bytes FROM cache_stats WHERE id = 0'
+        ).fetchone()
+        over_entries = entries > self._max_entries
+        over_size = self._max_size is not None and size > self._max_size
+        if not (over_entries or over_size):
+            return
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+            entries, size = db.execute(
+                'SELECT entries, bytes FROM cache_stats WHERE id = 0'
+            ).fetchone()
+            if entries > self._max_entries:
+                # Как и в LocMemCache, удаляется 1/CULL_FREQUENCY записей.
+                count = (entries // self._cull_frequency
+                         if self._cull_frequency else entries)
+                db.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                    'ORDER BY accessed LIMIT ?)', (max(count, 1),))
+            while self._max_size is not None:
+                entries, size = db.execute(
+                    'SELECT entries, bytes FROM cache_stats WHERE id = 0'
+                ).fetchone()
+                if size <= self._max_size or not entries:
+                    break
+                # Удаляется доля записей, пропорциональная превышению.
+                count = entries * (size - self._max_size) // size + 1
+                db.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                    'ORDER BY accessed LIMIT ?)', (count,))
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT: запись сразу берёт блокировку файла."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+class TwoLevelCache(BaseCache):
+    """Небольшой LRU в памяти процесса перед общим кэшем.
+
+    LOCATION - псевдоним общего кэша (второго уровня) в CACHES. Записи
+    первого уровня живут не дольше OPTIONS['L1_TIMEOUT'] секунд. Любая
+    запись через этот бэкенд публикует ключ в шину инвалидации, которая
+    хранится в самом общем кэше; остальные процессы читают шину не чаще
+    раза в OPTIONS['BUS_INTERVAL'] секунд и выбрасывают ключи из своего
+    первого уровня. Счётчики попаданий периодически суммируются в общем
+    кэше, их показывает команда cache_stats.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    BUS_SEQUENCE = 'l1bus:sequence'
+    BUS_EPOCH = 'l1bus:epoch'
+    BUS_TIMEOUT = 60
+    # Если пропущено больше событий шины, первый уровень очищается целиком.
+    BUS_WINDOW = 1000
+    STATS = ('l1_hits', 'l1_misses', 'l2_hits', 'l2_misses')
+    STATS_PREFIX = 'l1stats:'
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._l1_max_entries = options.get('L1_MAX_ENTRIES', 256)
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._bus_interval = options.get('BUS_INTERVAL', 1)
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._origin = uuid.uuid4().hex
+        self._epoch = None
+        self._seen = None
+        self._polled = 0
+        self._stats = dict.fromkeys(self.STATS, 0)
+
+    @cached_property
+    def shared(self):
+        from django.core.cache import caches
+
+        return caches[self._shared_alias]
+
+    # Первый уровень.
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            expires, pickled = entry
+            if expires <= time.monotonic():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+        return entry
+
+    def _l1_set(self, key, value):
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._lock:
+            self._l1[key] = (time.monotonic() + self._l1_timeout, pickled)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_evict(self, keys):
+        with self._lock:
+            for key in keys:
+                self._l1.pop(key, None)
+
+    def _l1_clear(self):
+        with self._lock:
+            self._l1.clear()
+
+    # Шина инвалидации.
+
+    def _publish(self, keys):
+        if self.shared.add(self.BUS_EPOCH, uuid.uuid4().hex, timeout=None):
+            self.shared.set(self.BUS_SEQUENCE, 0, timeout=None)
+        for key in keys:
+            try:
+                sequence = self.shared.incr(self.BUS_SEQUENCE)
+            except ValueError:
+                self.shared.add(self.BUS_SEQUENCE, 0, timeout=None)
+                sequence = self.shared.incr(self.BUS_SEQUENCE)
+            self.shared.set(f'l1bus:{sequence}', (self._origin, key),
+                            self.BUS_TIMEOUT)
+
+    def _poll(self):
+        now = time.monotonic()
+        if now - self._polled < self._bus_interval:
+            return
+        self._polled = now
+        self._flush_stats()
+        state = self.shared.get_many([self.BUS_EPOCH, self.BUS_SEQUENCE])
+        epoch = state.get(self.BUS_EPOCH)
+        sequence = state.get(self.BUS_SEQUENCE, 0)
+        if epoch != self._epoch or self._seen is None:
+            # Первый опрос или общий кэш очищен: старым данным не верим.
+            self._l1_clear()
+        elif not 0 <= sequence - self._seen <= self.BUS_WINDOW:
+            self._l1_clear()
+        elif sequence > self._seen:
+            names = [f'l1bus:{number}'
+                     for number in range(self._seen + 1, sequence + 1)]
+            events = self.shared.get_many(names)
+            if len(events) < len(names):
+                self._l1_clear()
+            else:
+                self._l1_evict([key for origin, key in events.values()
+                                if origin != self._origin])
+        self._epoch = epoch
+        self._seen = sequence
+
+    # Статистика.
+
+    def _count(self, name, amount=1):
+        self._stats[name] += amount
+
+    def _flush_stats(self):
+        with self._lock:
+            stats, self._stats = self._stats, dict.fromkeys(self.STATS, 0)
+        for name, amount in stats.items():
+            if not amount:
+                continue
+            key = self.STATS_PREFIX + name
+            self.shared.add(key, 0, timeout=None)
+            try:
+                self.shared.incr(key, amount)
+            except ValueError:
+                pass
+
+    def stats(self):
+        """Суммарные попадания всех процессов и доли попаданий уровней."""
+
+        self._flush_stats()
+        totals = {name: self.shared.get(self.STATS_PREFIX + name, 0)
+                  for name in self.STATS}
+        l1_total = totals['l1_hits'] + totals['l1_misses']
+        l2_total = totals['l2_hits'] + totals['l2_misses']
+        totals['l1_hit_rate'] = (totals['l1_hits'] / l1_total
+                                 if l1_total else None)
+        totals['l2_hit_rate'] = (totals['l2_hits'] / l2_total
+                                 if l2_total else None)
+        return totals
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = dict.fromkeys(self.STATS, 0)
+        self.shared.delete_many(
+            [self.STATS_PREFIX + name for name in self.STATS])
+
+    # Интерфейс Django-кэша.
+
+    def get(self, key, default=None, version=None):
+        self._poll()
+        name = self.make_key(key, version=version)
+        entry = self._l1_get(name)
+        if entry is not None:
+            self._count('l1_hits')
+            return pickle.loads(entry[1])
+        self._count('l1_misses')
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count('l2_misses')
+            return default
+        self._count('l2_hits')
+        self._l1_set(name, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._poll()
+        found = {}
+        missing = []
+        for key in keys:
+            entry = self._l1_get(self.make_key(key, version=version))
+            if entry is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(entry[1])
+        self._count('l1_hits', len(found))
+        self._count('l1_misses', len(missing))
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            self._count('l2_hits', len(shared))
+            self._count('l2_misses', len(missing) - len(shared))
+            for key, value in shared.items():
+                self._l1_set(self.make_key(key, version=version), value)
+            found.update(shared)
+        return found
+
+    def _changed(self, keys, version):
+        names = [self.make_key(key, version=version) for key in keys]
+        self._l1_evict(names)
+        self._publish(names)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._changed([key], version)
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._changed([key], version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self._changed(list(data), version)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version=version)
+        self._changed([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(keys, version=version)
+        self._changed(keys, version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._changed([key], version)
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def clear(self):
+        self.shared.clear()
+        self._l1_clear()
+        self._epoch = None
+        self._seen = None
+
+
+_MISSING = object()
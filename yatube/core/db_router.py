@@ -0,0 +1,135 @@
+"""Чтение лент с реплик базы данных.
+
+ReplicaRouter отправляет чтение моделей из REPLICA_MODELS на одну из
+баз REPLICA_DATABASES, но только внутри GET-запросов к сайту, которые
+пометила ReplicaMiddleware. Запись, команды manage.py, сигналы и тесты
+всегда работают с основной базой.
+
+Реплика отстаёт от основной базы, поэтому после записи через
+REPLICA_STICKY_VIEWS (новый пост, правка, комментарий, подписка)
+middleware ставит cookie REPLICA_STICKY_COOKIE: пока она жива, все
+чтения этого посетителя идут в основную базу и он сразу видит то, что
+только что сохранил. Срок cookie должен быть больше отставания реплики.
+
+Связанные менеджеры (author.posts) читают из базы своего объекта, а
+пользователи на реплику не ходят. Поэтому ленты, которые строятся от
+такого объекта, переводятся на реплику явно через on_replica().
+
+Страницы и фрагменты, которые попадают в общий кэш (core.page_cache,
+фрагмент главной), читаются внутри read_primary(): иначе страница,
+собранная по отстающей реплике, закэшировалась бы уже под новой
+версией после записи и жила бы в кэше до следующего сброса.
+
+Локально реплика - это копия db.sqlite3, которую периодически обновляет
+команда sync_replica через backup API SQLite.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_local = threading.local()
+
+
+def replica_for_read():
+    """Вернёт псевдоним реплики для чтения или None."""
+
+    if not getattr(_local, 'use_replica', False):
+        return None
+    if not settings.REPLICA_DATABASES:
+        return None
+    return random.choice(settings.REPLICA_DATABASES)
+
+
+def on_replica(queryset):
+    """queryset, который читает с реплики, если запросу это разрешено."""
+
+    alias = replica_for_read()
+    return queryset if alias is None else queryset.using(alias)
+
+
+@contextmanager
+def read_primary():
+    """Чтения внутри блока идут в основную базу. Работает и как
+    декоратор view."""
+
+    previous = getattr(_local, 'use_replica', False)
+    _local.use_replica = False
+    try:
+        yield
+    finally:
+        _local.use_replica = previous
+
+
+class ReplicaRouter:
+    """Читает модели лент с реплик, пишет всё в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in settings.REPLICA_MODELS:
+            return None
+        if hints.get('instance') is not None:
+            # Связанные объекты читаются из той же базы, что и объект.
+            return None
+        return replica_for_read()
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db and (
+                instance._state.db not in settings.REPLICA_DATABASES):
+            # Объекты других баз (например, архива) пишутся туда же,
+            # объекты с реплики - в основную базу.
+            return instance._state.db
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной базы, а в архиве лежат копии
+        # пользователей и групп, поэтому объекты из них совместимы.
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES,
+                     settings.ARCHIVE_DATABASE}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплику вместе с копией основной базы.
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+def _is_sticky(request):
+    return settings.REPLICA_STICKY_COOKIE in request.COOKIES
+
+
+class ReplicaMiddleware:
+    """Решает, может ли запрос читать с реплики, и ставит cookie
+    чтения своих записей после изменений через REPLICA_STICKY_VIEWS."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.use_replica = False
+        match = request.resolver_match
+        if (match is not None
+                and match.view_name in settings.REPLICA_STICKY_VIEWS
+                and response.status_code in (301, 302, 303)):
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.use_replica = (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name
+            not in settings.REPLICA_STICKY_VIEWS
+            and not _is_sticky(request)
+        )
@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache_backends import SQLiteCache
+
+
+def _write_keys(cache, keys, value):
+    for key in keys:
+        cache.set(key, value)
+
+
+def _count_hits(cache, keys, hits):
+    hits.value = len(cache.get_many(keys))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает SQLiteCache с LocMemCache и FileBasedCache: '
+            'скорость операций и общий доступ к данным из разных процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=2000)
+        parser.add_argument('--value-size', type=int, default=1024)
+        parser.add_argument('--processes', type=int, default=4)
+
+    def make_backends(self, directory):
+        params = {'OPTIONS': {'MAX_ENTRIES': 100_000}}
+        return {
+            'locmem': LocMemCache('benchmark', params),
+            'filebased': FileBasedCache(
+                os.path.join(directory, 'filebased'), params),
+            'sqlite': SQLiteCache(
+                os.path.join(directory, 'cache.sqlite3'), params),
+        }
+
+    def measure(self, operation, count):
+        started = time.perf_counter()
+        operation()
+        return count / (time.perf_counter() - started)
+
+    def shared_hit_ratio(self, cache, keys, value, processes):
+        """Доля ключей, записанных одним процессом и видимых другим."""
+
+        writer = multiprocessing.Process(target=_write_keys,
+                                         args=(cache, keys, value))
+        writer.start()
+        writer.join()
+        readers = []
+        for _ in range(processes):
+            hits = multiprocessing.Value('i', 0)
+            reader = multiprocessing.Process(target=_count_hits,
+                                             args=(cache, keys, hits))
+            reader.start()
+            readers.append((reader, hits))
+        total = 0
+        for reader, hits in readers:
+            reader.join()
+            total += hits.value
+        return total / (len(keys) * processes)
+
+    def handle(self, *args, **options):
+        count = options['operations']
+        value = b'x' * options['value_size']
+        keys = [f'key{number}' for number in range(count)]
+        batches = [keys[start:start + 10] for start in range(0, count, 10)]
+        header = (f'{"backend":<10} {"set/s":>10} {"get/s":>10} '
+                  f'{"get_many/s":>11} {"incr/s":>10} {"shared":>7}')
+        self.stdout.write(header)
+        with tempfile.TemporaryDirectory() as directory:
+            for name, cache in self.make_backends(directory).items():
+                cache.clear()
+                set_rate = self.measure(
+                    lambda: _write_keys(cache, keys, value), count)
+                get_rate = self.measure(
+                    lambda: [cache.get(key) for key in keys], count)
+                get_many_rate = self.measure(
+                    lambda: [cache.get_many(batch) for batch in batches],
+                    count)
+                cache.set('counter', 0)
+                incr_rate = self.measure(
+                    lambda: [cache.incr('counter') for _ in keys], count)
+                cache.clear()
+                shared = self.shared_hit_ratio(
+                    cache, [f'shared{number}' for number in range(100)],
+                    value, options['processes'])
+                self.stdout.write(
+                    f'{name:<10} {set_rate:>10.0f} {get_rate:>10.0f} '
+                    f'{get_many_rate:>11.0f} {incr_rate:>10.0f} '
+                    f'{shared:>7.0%}')
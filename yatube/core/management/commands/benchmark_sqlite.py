@@ -0,0 +1,160 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import apply_pragmas
+
+SCHEMA = """
+CREATE TABLE post (
+    id INTEGER PRIMARY KEY,
+    author_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    pub_date REAL NOT NULL
+);
+CREATE INDEX post_author_pub_date ON post (author_id, pub_date DESC);
+"""
+FEED_SQL = ('SELECT id, text, pub_date FROM post WHERE author_id = ? '
+            'ORDER BY pub_date DESC LIMIT 10')
+INSERT_SQL = 'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)'
+AUTHORS = 100
+
+
+class _Closing:
+    """Соединение на одну операцию, как при CONN_MAX_AGE = 0."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, *exc_info):
+        self.db.close()
+
+
+class _Keeping(_Closing):
+    """Постоянное соединение потока: после операции не закрывается."""
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class Worker(threading.Thread):
+    """Поток, который до остановки читает ленты или пишет посты."""
+
+    def __init__(self, connect, writer, stop):
+        super().__init__(daemon=True)
+        self.connect = connect
+        self.writer = writer
+        self.stop = stop
+        self.done = 0
+        self.locked = 0
+
+    def operation(self, db, number):
+        author_id = number % AUTHORS
+        if self.writer:
+            with db:
+                db.execute(INSERT_SQL, (author_id, 'x' * 200, time.time()))
+        else:
+            db.execute(FEED_SQL, (author_id,)).fetchall()
+
+    def run(self):
+        number = 0
+        while not self.stop.is_set():
+            number += 1
+            try:
+                with self.connect() as db:
+                    self.operation(db, number)
+            except sqlite3.OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+                self.locked += 1
+            else:
+                self.done += 1
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite с настройками по '
+            'умолчанию (новое соединение на запрос, журнал отката) и с '
+            'SQLITE_PRAGMAS и постоянными соединениями при одновременных '
+            'чтениях и записях из нескольких потоков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--rows', type=int, default=20_000)
+        parser.add_argument(
+            '--busy-timeout', type=float, default=5,
+            help='Ожидание блокировки в режиме по умолчанию, в секундах; '
+                 '5 - значение sqlite3 и Django по умолчанию.')
+
+    def prepare(self, path, rows):
+        with sqlite3.connect(path) as db:
+            db.executescript(SCHEMA)
+            db.executemany(INSERT_SQL, (
+                (number % AUTHORS, 'x' * 200, number)
+                for number in range(rows)))
+        os.sync()
+
+    def default_connect(self, path, timeout):
+        def connect():
+            return _Closing(sqlite3.connect(path, timeout=timeout))
+        return connect
+
+    def tuned_connect(self, path):
+        local = threading.local()
+
+        def connect():
+            db = getattr(local, 'db', None)
+            if db is None:
+                db = local.db = sqlite3.connect(path)
+                apply_pragmas(db, settings.SQLITE_PRAGMAS)
+            return _Keeping(db)
+        return connect
+
+    def run(self, connect, options):
+        stop = threading.Event()
+        workers = (
+            [Worker(connect, False, stop) for _ in range(options['readers'])]
+            + [Worker(connect, True, stop) for _ in range(options['writers'])]
+        )
+        for worker in workers:
+            worker.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for worker in workers:
+            worker.join()
+        seconds = options['seconds']
+        reads = sum(w.done for w in workers if not w.writer) / seconds
+        writes = sum(w.done for w in workers if w.writer) / seconds
+        locked = sum(w.locked for w in workers)
+        return reads, writes, locked
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"mode":<8} {"reads/s":>10} {"writes/s":>10} '
+                          f'{"locked":>8}')
+        results = {}
+        for mode in ('default', 'tuned'):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                self.prepare(path, options['rows'])
+                if mode == 'default':
+                    connect = self.default_connect(path,
+                                                   options['busy_timeout'])
+                else:
+                    connect = self.tuned_connect(path)
+                results[mode] = reads, writes, locked = self.run(connect,
+                                                                 options)
+            self.stdout.write(f'{mode:<8} {reads:>10.0f} {writes:>10.0f} '
+                              f'{locked:>8}')
+        (default_reads, default_writes, _), (reads, writes, _) = (
+            results['default'], results['tuned'])
+        self.stdout.write(
+            f'Ускорение: чтение x{reads / max(default_reads, 1):.1f}, '
+            f'запись x{writes / max(default_writes, 1):.1f}')
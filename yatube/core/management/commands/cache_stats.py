@@ -0,0 +1,24 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Показывает попадания в кэш первого (память процесса) '
+            'и второго (общий кэш) уровней, суммарно по всем процессам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить счётчики после вывода.')
+
+    def handle(self, *args, **options):
+        if not hasattr(cache, 'stats'):
+            raise CommandError('Кэш default не двухуровневый.')
+        stats = cache.stats()
+        for level in ('l1', 'l2'):
+            rate = stats[f'{level}_hit_rate']
+            rate = '-' if rate is None else f'{rate:.1%}'
+            self.stdout.write(
+                f'{level.upper()}: попаданий {stats[f"{level}_hits"]}, '
+                f'промахов {stats[f"{level}_misses"]}, доля {rate}')
+        if options['reset']:
+            cache.reset_stats()
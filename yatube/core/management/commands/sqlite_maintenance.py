@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def _pragma(cursor, statement):
+    cursor.execute(f'PRAGMA {statement}')
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class Command(BaseCommand):
+    help = ('Обслуживание баз SQLite: PRAGMA optimize, ANALYZE, '
+            'инкрементальная очистка свободных страниц и усечение WAL. '
+            'Рассчитана на запуск по расписанию (cron, systemd timer), '
+            'например раз в час.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append',
+                            help='Псевдоним базы; по умолчанию основная и '
+                                 'архив, если он включён.')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Полный ANALYZE вместо PRAGMA optimize.')
+        parser.add_argument('--vacuum-pages', type=int, default=1000,
+                            help='Сколько свободных страниц вернуть за раз.')
+        parser.add_argument(
+            '--enable-incremental-vacuum', action='store_true',
+            help='Перевести базу в auto_vacuum=INCREMENTAL. Выполняет '
+                 'полный VACUUM, поэтому запускайте вне часов нагрузки.')
+
+    def aliases(self, options):
+        if options['database']:
+            missing = set(options['database']) - set(connections)
+            if missing:
+                raise CommandError(
+                    f'Неизвестные базы: {", ".join(sorted(missing))}')
+            return options['database']
+        # Реплики - копии основной базы, их обновляет sync_replica вместе
+        # со статистикой. Выключенный архив не трогается: соединение с ним
+        # создало бы пустой файл базы.
+        used = {DEFAULT_DB_ALIAS, settings.ARCHIVE_DATABASE}
+        return [alias for alias in connections
+                if alias in used and connections[alias].vendor == 'sqlite']
+
+    def handle(self, *args, **options):
+        for alias in self.aliases(options):
+            with connections[alias].cursor() as cursor:
+                self.maintain(alias, cursor, options)
+
+    def maintain(self, alias, cursor, options):
+        if options['enable_incremental_vacuum']:
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+        if options['analyze']:
+            cursor.execute('ANALYZE')
+        else:
+            # Пересобирает статистику только там, где она устарела.
+            cursor.execute('PRAGMA optimize')
+        free_before = _pragma(cursor, 'freelist_count')
+        if _pragma(cursor, 'auto_vacuum') == 2:
+            cursor.execute(
+                f'PRAGMA incremental_vacuum({options["vacuum_pages"]})')
+            cursor.fetchall()
+        free_after = _pragma(cursor, 'freelist_count')
+        wal = 'нет'
+        if _pragma(cursor, 'journal_mode') == 'wal':
+            # Переносит WAL в базу и обрезает файл, если нет читателей.
+            busy = _pragma(cursor, 'wal_checkpoint(TRUNCATE)')
+            wal = 'занят' if busy else 'усечён'
+        self.stdout.write(
+            f'{alias}: свободных страниц {free_before} -> {free_after}, '
+            f'размер {_pragma(cursor, "page_count")} страниц, WAL {wal}')
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.sqlite import backup
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик через backup '
+            'API. С --interval повторяет копирование, пока не прервут: '
+            'так локально имитируется реплика с отставанием.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append',
+                            help='Псевдоним реплики; по умолчанию все '
+                                 'базы с TEST MIRROR.')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Пауза между копиями в секундах; 0 - '
+                                 'скопировать один раз.')
+
+    def aliases(self, options):
+        aliases = options['database'] or [
+            alias for alias in connections
+            if connections[alias].settings_dict['TEST']['MIRROR']]
+        if not aliases:
+            raise CommandError('Реплики не заданы: укажите --database.')
+        for alias in aliases:
+            if alias not in connections:
+                raise CommandError(f'Неизвестная база: {alias}')
+            if alias == DEFAULT_DB_ALIAS:
+                raise CommandError('Основная база не может быть репликой.')
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'{alias}: поддерживается только SQLite.')
+            if (connections[alias].settings_dict['NAME']
+                    == connections[DEFAULT_DB_ALIAS].settings_dict['NAME']):
+                raise CommandError(f'{alias}: это файл основной базы.')
+        return aliases
+
+    def handle(self, *args, **options):
+        aliases = self.aliases(options)
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('Основная база должна быть SQLite.')
+        while True:
+            self.sync(aliases)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, aliases):
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        for alias in aliases:
+            started = time.perf_counter()
+            backup(primary.connection,
+                   connections[alias].settings_dict['NAME'])
+            self.stdout.write(
+                f'{alias}: скопирована за '
+                f'{time.perf_counter() - started:.2f} с')
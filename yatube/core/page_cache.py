@@ -0,0 +1,119 @@
+"""Кэш целых страниц для анонимных посетителей.
+
+Каждая закэшированная страница помечена суррогатными ключами вида
+'post:<id>', 'group:<slug>', 'author:<username>'. У каждого ключа в кэше
+хранится номер версии, и страница запоминает версии своих ключей.
+purge() увеличивает версию ключа, после чего все страницы с этим ключом
+перестают совпадать по версиям и рендерятся заново; остальные страницы
+сайта остаются в кэше.
+
+Страница для кэша рендерится по основной базе (core.db_router): версии
+ключей уже новые, и страница с отстающей реплики прожила бы в кэше до
+следующего сброса.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .db_router import read_primary
+
+PAGE_PREFIX = 'page:'
+SURROGATE_PREFIX = 'surrogate:'
+CACHE_HEADER = 'X-Page-Cache'
+
+
+def _surrogate_versions(keys):
+    tags = [SURROGATE_PREFIX + key for key in keys]
+    versions = cache.get_many(tags)
+    missing = [tag for tag in tags if tag not in versions]
+    if missing:
+        # Новая версия не должна совпасть с вытесненной из кэша старой.
+        initial = int(time.time() * 1000)
+        for tag in missing:
+            cache.add(tag, initial, timeout=None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def purge(*keys):
+    """Сбрасывает все страницы, помеченные любым из ключей."""
+
+    for key in keys:
+        try:
+            cache.incr(SURROGATE_PREFIX + key)
+        except ValueError:
+            # Версии нет - значит, нет и страниц, которые её запомнили.
+            pass
+
+
+def add_surrogate_keys(request, *keys):
+    """Помечает кэшируемую страницу ключами, известными только во view."""
+
+    versions = getattr(request, 'surrogate_versions', None)
+    if versions is not None:
+        versions.update(_surrogate_versions(keys))
+
+
+def _is_cacheable_request(request):
+    return (
+        settings.PAGE_CACHE_ENABLED
+        and request.method == 'GET'
+        and not request.user.is_authenticated
+    )
+
+
+def _is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+    )
+
+
+def cache_page_for_anonymous(*key_templates):
+    """Кэширует ответ view для анонимных посетителей.
+
+    key_templates - суррогатные ключи страницы; в них подставляются
+    именованные аргументы url, например 'group:{slug}'.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+            page_key = PAGE_PREFIX + hashlib.md5(
+                request.get_full_path().encode()).hexdigest()
+            entry = cache.get(page_key)
+            if entry is not None:
+                content, content_type, versions = entry
+                if cache.get_many(list(versions)) == versions:
+                    response = HttpResponse(content,
+                                            content_type=content_type)
+                    response[CACHE_HEADER] = 'hit'
+                    return response
+            # Версии читаются до рендера: если во время рендера ключ
+            # сбросят, страница сохранится уже устаревшей по версии.
+            request.surrogate_versions = _surrogate_versions(
+                [template.format(**kwargs) for template in key_templates])
+            with read_primary():
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    # Отложенный шаблон тоже должен читать основную базу.
+                    response.render()
+            if _is_cacheable_response(request, response):
+                cache.set(
+                    page_key,
+                    (response.content, response['Content-Type'],
+                     request.surrogate_versions),
+                    settings.PAGE_CACHE_TIMEOUT,
+                )
+                response[CACHE_HEADER] = 'miss'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,49 @@
+"""Плагин pytest: тест падает, если страница вышла за бюджет запросов.
+
+Подключается в conftest.py корня репозитория. Во время каждого теста
+QueryBudgetMiddleware включена, а нарушения, которые она нашла
+(core.query_budget.violations), превращаются в ошибку теста. Миниатюры
+в тестах создаются синхронно, кэши в файлах заменены кэшами в памяти
+(core.testing).
+"""
+import pytest
+from django.test.utils import override_settings
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'query_budget_exempt: не проверять бюджет запросов в этом тесте',
+    )
+
+
+@pytest.fixture(scope='session', autouse=True)
+def caches_in_memory():
+    from core.testing import memory_caches
+
+    with override_settings(CACHES=memory_caches()):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def query_budget(request):
+    if request.node.get_closest_marker('query_budget_exempt'):
+        yield
+        return
+    from core import query_budget
+
+    query_budget.violations.clear()
+    with override_settings(QUERY_BUDGET_ENABLED=True):
+        yield
+    if query_budget.violations:
+        found = '\n'.join(str(violation)
+                          for violation in query_budget.violations)
+        query_budget.violations.clear()
+        pytest.fail(f'Превышен бюджет запросов:\n{found}', pytrace=False)
+
+
+@pytest.fixture(autouse=True)
+def synchronous_thumbnails():
+    # Фоновый поток не переживёт тест, который удаляет MEDIA_ROOT.
+    with override_settings(THUMBNAIL_BACKGROUND=False):
+        yield
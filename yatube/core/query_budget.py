@@ -0,0 +1,139 @@
+"""Бюджет SQL-запросов на страницу и поиск N+1.
+
+QueryBudgetMiddleware считает запросы каждого запроса к сайту через
+connection.execute_wrapper. Для url из пространств имён
+QUERY_BUDGET_NAMESPACES число запросов сравнивается с бюджетом из
+QUERY_BUDGETS (или QUERY_BUDGET_DEFAULT), а один и тот же SQL,
+выполненный больше QUERY_BUDGET_REPEAT_LIMIT раз, считается признаком
+N+1: так выглядит цикл в шаблоне, который на каждой итерации ходит в БД.
+Страница, которая дочитывает ленту из архива (posts.archive), получает
+к бюджету ещё QUERY_BUDGET_ARCHIVE запросов.
+
+Нарушения пишутся в лог и в список violations; плагин pytest
+(core.pytest_plugin) роняет тест, во время которого они появились.
+"""
+import logging
+import threading
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+violations = []
+
+# Управляющие транзакцией команды повторяются законно и N+1 не считаются.
+TRANSACTION_SQL = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT',
+                   'ROLLBACK TO SAVEPOINT')
+
+_local = threading.local()
+
+
+class Violation:
+    """Страница, которая вышла за бюджет или повторяет один запрос."""
+
+    def __init__(self, url_name, path, count, budget, repeated):
+        self.url_name = url_name
+        self.path = path
+        self.count = count
+        self.budget = budget
+        self.repeated = repeated
+
+    def __str__(self):
+        message = (f'{self.url_name} ({self.path}): {self.count} '
+                   f'запросов при бюджете {self.budget}')
+        for sql, times in self.repeated.items():
+            message += f'\n  {times} раз: {sql}'
+        return message
+
+
+class QueryCounter:
+    """Обёртка execute_wrapper: считает запросы и их текст."""
+
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+        self.databases = set()
+        self.paused = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.paused:
+            return execute(sql, params, many, context)
+        self.count += 1
+        self.databases.add(context['connection'].alias)
+        # Параметры передаются отдельно, поэтому одинаковый текст SQL -
+        # это один и тот же запрос с разными значениями.
+        self.shapes[sql] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, limit):
+        return {sql: times for sql, times in self.shapes.items()
+                if times > limit and not sql.startswith(TRANSACTION_SQL)}
+
+
+@contextmanager
+def exempt():
+    """Не считать запросы внутри блока в бюджет текущей страницы.
+
+    Для работы, которая в проде идёт в фоне, а при отладке и в тестах
+    выполняется прямо в запросе.
+    """
+
+    counter = getattr(_local, 'counter', None)
+    if counter is None or counter.paused:
+        yield
+        return
+    counter.paused = True
+    try:
+        yield
+    finally:
+        counter.paused = False
+
+
+def budget_for(url_name, databases=()):
+    budget = settings.QUERY_BUDGETS.get(url_name,
+                                        settings.QUERY_BUDGET_DEFAULT)
+    if settings.ARCHIVE_DATABASE in databases:
+        budget += settings.QUERY_BUDGET_ARCHIVE
+    return budget
+
+
+def check(request, counter):
+    """Вернёт нарушение для выполненного запроса к сайту или None."""
+
+    match = request.resolver_match
+    if match is None or match.namespace not in (
+            settings.QUERY_BUDGET_NAMESPACES):
+        return None
+    budget = budget_for(match.view_name, counter.databases)
+    repeated = counter.repeated(settings.QUERY_BUDGET_REPEAT_LIMIT)
+    if counter.count <= budget and not repeated:
+        return None
+    return Violation(match.view_name, request.path, counter.count, budget,
+                     repeated)
+
+
+class QueryBudgetMiddleware:
+    """Следит за числом запросов к БД, если QUERY_BUDGET_ENABLED."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGET_ENABLED:
+            return self.get_response(request)
+        counter = _local.counter = QueryCounter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(counter))
+                response = self.get_response(request)
+        finally:
+            _local.counter = None
+        violation = check(request, counter)
+        if violation is not None:
+            violations.append(violation)
+            logger.warning('Превышен бюджет запросов: %s', violation)
+        return response
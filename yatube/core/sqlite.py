@@ -0,0 +1,46 @@
+"""Настройка соединений SQLite для работы под нагрузкой.
+
+Каждое новое соединение Django с SQLite получает PRAGMA из
+SQLITE_PRAGMAS. Главная из них - journal_mode=WAL: читатели не ждут
+писателя, а писатель не ждёт читателей, поэтому post_create и
+add_comment больше не блокируют ленты. busy_timeout заставляет второго
+писателя подождать, а не сразу получить "database is locked".
+Соединения переиспользуются между запросами (CONN_MAX_AGE), так что
+настройка выполняется один раз на соединение, а не на каждый запрос.
+
+backup() снимает согласованную копию базы; так команда sync_replica
+обновляет локальную реплику для core.db_router.
+"""
+import sqlite3
+
+from django.conf import settings
+
+
+def apply_pragmas(db, pragmas):
+    """Выполняет PRAGMA на соединении sqlite3."""
+
+    for name, value in pragmas.items():
+        db.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик connection_created: настраивает новое соединение."""
+
+    if connection.vendor != 'sqlite':
+        return
+    apply_pragmas(connection.connection, settings.SQLITE_PRAGMAS)
+
+
+def backup(source, path):
+    """Копирует базу соединения sqlite3 source в файл path.
+
+    Используется backup API: копия согласована, даже если в source
+    продолжают писать, а открытые соединения к path видят новую версию
+    базы целиком после окончания копирования.
+    """
+
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
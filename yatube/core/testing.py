@@ -0,0 +1,39 @@
+"""Кэши для тестов.
+
+Общий кэш сайта лежит в файле SQLite рядом с проектом. Тесты не должны
+читать записи сервера разработки и стирать их через cache.clear(),
+поэтому на время тестов кэши в файлах заменяются кэшами в памяти.
+Подключается в TEST_RUNNER для manage.py test и в core.pytest_plugin.
+"""
+import copy
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+FILE_BACKENDS = ('core.cache_backends.SQLiteCache',
+                 'django.core.cache.backends.filebased.FileBasedCache')
+
+
+def memory_caches():
+    """CACHES, в которых кэши в файлах заменены кэшами в памяти."""
+
+    caches = copy.deepcopy(settings.CACHES)
+    for alias, config in caches.items():
+        if config['BACKEND'] in FILE_BACKENDS:
+            caches[alias] = {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': f'test-{alias}',
+            }
+    return caches
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = override_settings(CACHES=memory_caches())
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
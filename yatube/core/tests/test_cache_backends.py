@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from core.cache_backends import SQLiteCache
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.location = os.path.join(self.directory.name, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """Операции Django-кэша работают как у встроенных бэкендов."""
+
+        self.cache.set('post', {'text': 'Тест'})
+        self.assertEqual(self.cache.get('post'), {'text': 'Тест'})
+        self.assertFalse(self.cache.add('post', 'другое'))
+        self.assertTrue(self.cache.add('group', 'slug'))
+        self.cache.set_many({'a': 1, 'b': b'bytes'})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'missing']),
+                         {'a': 1, 'b': b'bytes'})
+        self.assertEqual(self.cache.incr('a', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.delete_many(['a', 'b'])
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('post'))
+
+    def test_expired_entries_are_invisible(self):
+        """Просроченная запись не читается и не мешает add."""
+
+        self.cache.set('key', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_entries_are_shared_between_instances(self):
+        """Второй экземпляр (другой процесс) видит те же данные."""
+
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_incr_is_atomic_between_processes(self):
+        """incr из нескольких процессов не теряет приращений."""
+
+        self.cache.set('counter', 0)
+        processes = [
+            multiprocessing.Process(target=_increment,
+                                    args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_least_recently_used_entries_are_culled(self):
+        """При переполнении удаляются давно не читавшиеся записи."""
+
+        cache = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        for number in range(10):
+            cache.set(f'key{number}', number)
+        cache._db.execute("UPDATE cache SET accessed = ? WHERE key != ?",
+                          (time.time() - 60, cache.make_key('key0')))
+        cache.set('key10', 10)
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertEqual(cache.get('key10'), 10)
+        self.assertLessEqual(len(cache.get_many(
+            [f'key{number}' for number in range(11)])), 10)
+
+    def test_size_cap(self):
+        """Суммарный размер записей не превышает MAX_SIZE."""
+
+        cache = self.make_cache(MAX_SIZE=10_000)
+        for number in range(20):
+            cache.set(f'key{number}', b'x' * 1000)
+        size, = cache._db.execute(
+            'SELECT bytes FROM cache_stats').fetchone()
+        self.assertLessEqual(size, 10_000)
+        self.assertIsNotNone(cache.get('key19'))
+
+
+class TestCachesTest(SimpleTestCase):
+    def test_tests_do_not_touch_site_cache(self):
+        """Тесты работают с кэшами в памяти, а не с файлом кэша сайта."""
+
+        for alias, config in settings.CACHES.items():
+            with self.subTest(alias=alias):
+                self.assertNotEqual(config['BACKEND'],
+                                    'core.cache_backends.SQLiteCache')
@@ -0,0 +1,200 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from core.db_router import ReplicaMiddleware, ReplicaRouter
+from posts.models import AuthorStats, Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(REPLICA_DATABASES=('replica',))
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def read_database(self, request):
+        """Вернёт базу, из которой view прочитала бы посты."""
+
+        databases = []
+
+        def view(request):
+            databases.append(Post.objects.all().db)
+            return HttpResponse()
+
+        def get_response(request):
+            request.resolver_match = resolve(request.path)
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = ReplicaMiddleware(get_response)
+        middleware(request)
+        return databases[0]
+
+    def test_get_reads_from_replica(self):
+        """GET-страница читает посты с реплики."""
+
+        request = self.factory.get(reverse('posts:index'))
+        self.assertEqual(self.read_database(request), 'replica')
+
+    def test_post_reads_from_primary(self):
+        """Запрос, который меняет данные, читает из основной базы."""
+
+        request = self.factory.post(reverse('posts:post_create'))
+        self.assertEqual(self.read_database(request), 'default')
+
+    def test_sticky_view_reads_from_primary(self):
+        """GET на подписку читает из основной базы."""
+
+        request = self.factory.get(
+            reverse('posts:profile_follow', args=('auth',)))
+        self.assertEqual(self.read_database(request), 'default')
+
+    def test_sticky_cookie_reads_from_primary(self):
+        """После своей записи посетитель читает из основной базы."""
+
+        request = self.factory.get(reverse('posts:index'))
+        request.COOKIES[settings.REPLICA_STICKY_COOKIE] = '1'
+        self.assertEqual(self.read_database(request), 'default')
+
+    def test_outside_request_reads_from_primary(self):
+        """Вне запроса к сайту всё читается из основной базы."""
+
+        self.assertEqual(Post.objects.all().db, 'default')
+
+    def test_writes_and_related_objects(self):
+        """Запись идёт в основную базу, связанные объекты - из базы
+        исходного объекта."""
+
+        router = ReplicaRouter()
+        post = Post(pk=1)
+        post._state.db = 'default'
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertIsNone(router.db_for_read(Comment, instance=post))
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        self.assertIsNone(router.allow_migrate('default', 'posts'))
+
+
+class StickyCookieTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_cookie_after_write(self):
+        """Редирект после записи ставит cookie чтения из основной базы."""
+
+        cookie = settings.REPLICA_STICKY_COOKIE
+        response = self.authorized_client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'})
+        self.assertEqual(response.cookies[cookie]['max-age'],
+                         settings.REPLICA_STICKY_SECONDS)
+        response = self.authorized_client.get(
+            reverse('posts:profile_follow', args=(self.author.username,)))
+        self.assertIn(cookie, response.cookies)
+        self.assertTrue(Follow.objects.filter(user=self.user,
+                                              author=self.author).exists())
+
+    def test_no_cookie_after_read(self):
+        """Обычная страница cookie не ставит."""
+
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+
+# Отстающая реплика: отдельная тестовая база, куда не попадают записи.
+@override_settings(REPLICA_DATABASES=('archive',), PAGE_CACHE_ENABLED=True)
+class StaleReplicaCacheTest(TestCase):
+    databases = {'default', 'archive'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, group=self.group, text='Свежий пост')
+        self.assertFalse(
+            Post.objects.using('archive').filter(pk=self.post.pk).exists())
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cached_pages_read_primary(self):
+        """Страница для общего кэша собирается по основной базе."""
+
+        for url in (reverse('posts:index'),
+                    reverse('posts:group_list', args=(self.group.slug,))):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), self.post.text)
+                self.assertContains(self.client.get(url), self.post.text)
+
+    def test_index_fragment_reads_primary(self):
+        """Фрагмент главной из общего кэша собран по основной базе."""
+
+        client = Client()
+        client.force_login(self.user)
+        self.assertContains(client.get(reverse('posts:index')),
+                            self.post.text)
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            self.post.text)
+
+
+# Реплика с другим текстом поста: по странице видно, откуда он прочитан.
+@override_settings(REPLICA_DATABASES=('archive',))
+class ReplicaReadsTest(TestCase):
+    databases = {'default', 'archive'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Пост из основной базы')
+        User.objects.using('archive').bulk_create(
+            [User(pk=cls.author.pk, username=cls.author.username)])
+        AuthorStats.objects.using('archive').bulk_create(
+            [AuthorStats(user_id=cls.author.pk, posts_count=1)])
+        Group.objects.using('archive').bulk_create(
+            [Group(pk=cls.group.pk, title='Группа', slug='group')])
+        Post.objects.using('archive').bulk_create(
+            [Post(pk=cls.post.pk, author_id=cls.author.pk,
+                  group_id=cls.group.pk, text='Пост с реплики')])
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feeds_read_replica(self):
+        """Страницы автора, группы и поста читают посты с реплики."""
+
+        urls = (reverse('posts:profile', args=(self.author.username,)),
+                reverse('posts:group_list', args=(self.group.slug,)),
+                reverse('posts:post_detail', args=(self.post.pk,)))
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Пост с реплики')
+                self.assertNotContains(response, 'Пост из основной базы')
+
+
+class SyncReplicaCommandTest(TestCase):
+    def test_mirror_is_not_overwritten(self):
+        """Реплика, которая указывает на основную базу, не копируется."""
+
+        with self.assertRaisesMessage(CommandError, 'файл основной базы'):
+            call_command('sync_replica')
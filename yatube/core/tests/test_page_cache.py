@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.page_cache import CACHE_HEADER
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='Jack')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(author=cls.user, text='Первый пост',
+                                       group=cls.group)
+        cls.other_post = Post.objects.create(author=cls.user,
+                                             text='Второй пост')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_anonymous_pages_are_cached(self):
+        """Повторный запрос анонима отдаётся из кэша."""
+
+        urls = (reverse('posts:index'),
+                reverse('posts:group_list', args=(self.group.slug,)),
+                reverse('posts:profile', args=(self.user.username,)),
+                reverse('posts:post_detail', args=(self.post.pk,)),
+                reverse('about:author'),
+                reverse('about:tech'))
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.guest_client.get(url)[CACHE_HEADER],
+                                 'miss')
+                self.assertEqual(self.guest_client.get(url)[CACHE_HEADER],
+                                 'hit')
+
+    def test_authorized_pages_are_not_cached(self):
+        """Страницы для авторизованных пользователей не кэшируются."""
+
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header(CACHE_HEADER))
+
+    def test_comment_purges_only_its_post(self):
+        """Комментарий сбрасывает страницу своего поста, но не чужого."""
+
+        post_url = reverse('posts:post_detail', args=(self.post.pk,))
+        other_url = reverse('posts:post_detail', args=(self.other_post.pk,))
+        self.guest_client.get(post_url)
+        self.guest_client.get(other_url)
+
+        Comment.objects.create(author=self.reader, post=self.post,
+                               text='Комментарий')
+
+        self.assertEqual(self.guest_client.get(post_url)[CACHE_HEADER],
+                         'miss')
+        self.assertEqual(self.guest_client.get(other_url)[CACHE_HEADER],
+                         'hit')
+
+    def test_new_post_purges_feeds(self):
+        """Новый пост сразу виден на главной, в группе и в профиле."""
+
+        urls = (reverse('posts:index'),
+                reverse('posts:group_list', args=(self.group.slug,)),
+                reverse('posts:profile', args=(self.user.username,)))
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.create(author=self.user, text='Свежий пост',
+                            group=self.group)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url),
+                                    'Свежий пост')
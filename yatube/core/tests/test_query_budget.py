@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from core import query_budget
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+def query_view(times, sql='SELECT %s'):
+    """get_response для middleware: выполняет запрос times раз."""
+
+    def view(request):
+        with connection.cursor() as cursor:
+            for number in range(times):
+                cursor.execute(sql, [number])
+        return HttpResponse()
+    return view
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_DEFAULT=5,
+                   QUERY_BUDGET_REPEAT_LIMIT=2,
+                   QUERY_BUDGETS={'posts:index': 3})
+class QueryBudgetMiddlewareTest(TestCase):
+    def setUp(self):
+        query_budget.violations.clear()
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        query_budget.violations.clear()
+
+    def get(self, path, view):
+        request = self.factory.get(path)
+        request.resolver_match = resolve(path)
+        return query_budget.QueryBudgetMiddleware(view)(request)
+
+    def test_budget_exceeded(self):
+        """Страница сверх объявленного бюджета попадает в нарушения."""
+
+        self.get(reverse('posts:index'),
+                 query_view(4, 'SELECT %s UNION SELECT 1'))
+        violation, = query_budget.violations
+        self.assertEqual(violation.url_name, 'posts:index')
+        self.assertEqual((violation.count, violation.budget), (4, 3))
+
+    def test_repeated_query_is_n_plus_one(self):
+        """Один и тот же SQL больше лимита повторов - это N+1."""
+
+        self.get(reverse('posts:search'), query_view(3))
+        violation, = query_budget.violations
+        self.assertEqual(violation.repeated, {'SELECT %s': 3})
+        self.assertIn('3 раз: SELECT %s', str(violation))
+
+    def test_within_budget(self):
+        """Страница в пределах бюджета без повторов не нарушает его."""
+
+        self.get(reverse('posts:search'), query_view(2))
+        self.assertEqual(query_budget.violations, [])
+
+    def test_other_namespaces_are_ignored(self):
+        """Страницы вне QUERY_BUDGET_NAMESPACES не проверяются."""
+
+        self.get(reverse('about:author'), query_view(10))
+        self.assertEqual(query_budget.violations, [])
+
+    def test_exempt_queries_are_not_counted(self):
+        """Запросы внутри exempt() не входят в бюджет страницы."""
+
+        def view(request):
+            with query_budget.exempt():
+                query_view(10)(request)
+            return query_view(1)(request)
+
+        self.get(reverse('posts:index'), view)
+        self.assertEqual(query_budget.violations, [])
+
+    @override_settings(QUERY_BUDGET_ENABLED=False)
+    def test_disabled(self):
+        """Выключенная middleware ничего не проверяет."""
+
+        self.get(reverse('posts:index'), query_view(10))
+        self.assertEqual(query_budget.violations, [])
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True)
+class PageQueryBudgetTest(TestCase):
+    """Страницы поста укладываются в бюджет при любом числе комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        for number in range(5):
+            author = User.objects.create_user(username=f'reader{number}')
+            Comment.objects.create(post=cls.post, author=author,
+                                   text=f'Комментарий {number}')
+
+    def setUp(self):
+        query_budget.violations.clear()
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        query_budget.violations.clear()
+        cache.clear()
+
+    def test_post_detail_comments(self):
+        """Авторы комментариев не загружаются по одному."""
+
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertContains(response, 'reader4')
+        self.assertEqual(query_budget.violations, [])
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from core.sqlite import apply_pragmas, backup
+
+
+class SQLiteSetupTest(TestCase):
+    databases = {'default', 'archive'}
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_pragmas(self):
+        """Новое соединение получает PRAGMA из SQLITE_PRAGMAS."""
+
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('temp_store'), 2)
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'WAL',
+                                       'synchronous': 'NORMAL'})
+    def test_file_database_uses_wal(self):
+        """База в файле переходит в режим WAL."""
+
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'db.sqlite3'))
+            apply_pragmas(db, settings.SQLITE_PRAGMAS)
+            self.assertEqual(
+                db.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(
+                db.execute('PRAGMA synchronous').fetchone()[0], 1)
+            db.close()
+
+    def test_backup(self):
+        """backup() копирует базу в файл целиком."""
+
+        source = sqlite3.connect(':memory:')
+        source.execute('CREATE TABLE post (text TEXT)')
+        source.executemany('INSERT INTO post VALUES (?)',
+                           [('Первый',), ('Второй',)])
+        source.commit()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            backup(source, path)
+            replica = sqlite3.connect(path)
+            self.assertEqual(
+                replica.execute('SELECT COUNT(*) FROM post').fetchone()[0], 2)
+            replica.close()
+        source.close()
+
+    def test_maintenance_command(self):
+        """sqlite_maintenance обслуживает основную базу и включённый
+        архив."""
+
+        out = StringIO()
+        call_command('sqlite_maintenance', stdout=out)
+        self.assertIn('default: свободных страниц', out.getvalue())
+        self.assertNotIn('archive:', out.getvalue())
+        self.assertNotIn('replica:', out.getvalue())
+        out = StringIO()
+        with self.settings(ARCHIVE_DATABASE='archive'):
+            call_command('sqlite_maintenance', stdout=out)
+        self.assertIn('default: свободных страниц', out.getvalue())
+        self.assertIn('archive: свободных страниц', out.getvalue())
+
+    def test_benchmark_command(self):
+        """benchmark_sqlite сравнивает оба режима."""
+
+        out = StringIO()
+        call_command('benchmark_sqlite', '--seconds', '0.2', '--rows', '100',
+                     '--readers', '2', '--writers', '1', stdout=out)
+        self.assertIn('tuned', out.getvalue())
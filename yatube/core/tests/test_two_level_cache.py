@@ -0,0 +1,79 @@
+from django.test import SimpleTestCase, override_settings
+
+from core.cache_backends import TwoLevelCache
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-level-test',
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+class TwoLevelCacheTest(SimpleTestCase):
+    def setUp(self):
+        # Два экземпляра изображают два WSGI-процесса со своим L1.
+        self.first = self.make_cache()
+        self.second = self.make_cache()
+        self.first.clear()
+
+    def tearDown(self):
+        self.first.clear()
+
+    def make_cache(self, **options):
+        options.setdefault('BUS_INTERVAL', 0)
+        return TwoLevelCache('shared', {'OPTIONS': options})
+
+    def test_second_read_is_served_from_memory(self):
+        """Повторное чтение отдаётся из первого уровня."""
+
+        self.first.set('group', 'slug')
+        self.first.reset_stats()
+        self.assertEqual(self.second.get('group'), 'slug')
+        self.assertEqual(self.second.get('group'), 'slug')
+        self.assertIsNone(self.second.get('missing'))
+        stats = self.second.stats()
+        self.assertEqual(stats['l1_hits'], 1)
+        self.assertEqual(stats['l2_hits'], 1)
+        self.assertEqual(stats['l2_misses'], 1)
+        self.assertEqual(stats['l1_hit_rate'], 1 / 3)
+
+    def test_writes_evict_other_workers(self):
+        """Запись в одном процессе сбрасывает L1 других процессов."""
+
+        self.first.set('version', 1)
+        self.assertEqual(self.second.get('version'), 1)
+        self.first.incr('version')
+        self.assertEqual(self.second.get('version'), 2)
+        self.first.delete('version')
+        self.assertIsNone(self.second.get('version'))
+
+    def test_bus_interval_bounds_staleness(self):
+        """Между опросами шины L1 может отдавать старое значение."""
+
+        lazy = self.make_cache(BUS_INTERVAL=60)
+        self.first.set('key', 'old')
+        self.assertEqual(lazy.get('key'), 'old')
+        self.first.set('key', 'new')
+        self.assertEqual(lazy.get('key'), 'old')
+        self.assertEqual(self.second.get('key'), 'new')
+
+    def test_clear_flushes_other_workers(self):
+        """Очистка общего кэша очищает L1 во всех процессах."""
+
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.first.clear()
+        self.assertIsNone(self.second.get('key'))
+
+    def test_l1_is_bounded(self):
+        """Первый уровень хранит не больше L1_MAX_ENTRIES ключей."""
+
+        small = self.make_cache(L1_MAX_ENTRIES=2)
+        small.set_many({'a': 1, 'b': 2, 'c': 3})
+        small.get_many(['a', 'b', 'c'])
+        self.assertEqual(len(small._l1), 2)
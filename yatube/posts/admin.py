@@ -1,9 +1,17 @@
 from django.contrib import admin
 
 from .models import Comment, Follow, Group, Post
+from .search import filter_matching
 
 
-class PostAdmin(admin.ModelAdmin):
+class FullTextSearchMixin:
+    """Поиск в админке по индексу FTS5 вместо LIKE '%...%'."""
+
+    def get_search_results(self, request, queryset, search_term):
+        return filter_matching(queryset, search_term), False
+
+
+class PostAdmin(FullTextSearchMixin, admin.ModelAdmin):
     """Класс для настройки отображения модели в интерфейсе админки."""
 
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
@@ -12,6 +20,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def save_model(self, request, obj, form, change):
+        if 'image' in form.changed_data:
+            obj.update_image_metadata()
+        super().save_model(request, obj, form, change)
+
 
 class GroupAdmin(admin.ModelAdmin):
     """Класс для настройки отображения модели в интерфейсе админки."""
@@ -21,7 +34,7 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     """Класс для настройки отображения модели в интерфейсе админки."""
 
     list_display = ('pk', 'post', 'author', 'text',)
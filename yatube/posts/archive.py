@@ -0,0 +1,251 @@
+"""Архив старых постов в отдельной базе.
+
+Команда archive_posts пачками переносит посты старше ARCHIVE_AFTER_DAYS
+вместе с комментариями из основной базы в базу ARCHIVE_DATABASE. В
+основной таблице остаются только свежие посты, которые читают ленты,
+поэтому она и её индексы помещаются в кэш страниц SQLite.
+
+Архив только читается. Страницы автора и группы продолжаются архивными
+постами (ArchivedFeed), а post_detail находит пост в любой из баз.
+Главная, теги, поиск и лента подписок показывают только свежие посты.
+Вместе с постами в архив копируются их авторы, авторы комментариев и
+группы: так в архиве работают внешние ключи и select_related.
+
+Пока ARCHIVE_DATABASE не задан, архив выключен и всё читается из
+основной базы.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import Comment, Group, Post
+
+User = get_user_model()
+
+# Модели, строки которых переезжают в архив.
+ARCHIVED_MODELS = (Post, Comment)
+
+_local = threading.local()
+
+
+def databases():
+    """Базы, в которых лежат посты: основная и, если задан, архив."""
+
+    if settings.ARCHIVE_DATABASE:
+        return [DEFAULT_DB_ALIAS, settings.ARCHIVE_DATABASE]
+    return [DEFAULT_DB_ALIAS]
+
+
+def is_archived(obj):
+    """Объект прочитан из архива."""
+
+    return bool(settings.ARCHIVE_DATABASE
+                and obj._state.db == settings.ARCHIVE_DATABASE)
+
+
+def is_moving():
+    """Идёт перенос в архив: удаление из основной базы - не удаление
+    поста, счётчики и картинки трогать нельзя."""
+
+    return getattr(_local, 'moving', False)
+
+
+@contextmanager
+def _moving():
+    _local.moving = True
+    try:
+        yield
+    finally:
+        _local.moving = False
+
+
+class ArchivedFeed:
+    """Лента из свежих постов, за которыми идут архивные.
+
+    Все архивные посты старше свежих, поэтому ленту можно резать как
+    одну последовательность: срез сначала берётся из основной базы и
+    дочитывается из архива. Число постов в каждой базе считается один
+    раз на ленту, по нему срез сразу знает, из какой базы читать.
+    Поддерживает то, что нужно Paginator и CursorPaginator: count(),
+    filter(), order_by() и срезы.
+    """
+
+    ordered = True
+
+    def __init__(self, hot, archived, ascending=False):
+        self.hot = hot
+        self.archived = archived
+        self.ascending = ascending
+
+    @cached_property
+    def hot_count(self):
+        return self.hot.count()
+
+    @cached_property
+    def archived_count(self):
+        return self.archived.count()
+
+    def count(self):
+        return self.hot_count + self.archived_count
+
+    def filter(self, *args, **kwargs):
+        return ArchivedFeed(self.hot.filter(*args, **kwargs),
+                            self.archived.filter(*args, **kwargs),
+                            self.ascending)
+
+    def order_by(self, *fields):
+        feed = ArchivedFeed(self.hot.order_by(*fields),
+                            self.archived.order_by(*fields),
+                            not fields[0].startswith('-'))
+        # Порядок не меняет числа постов.
+        for name in ('hot_count', 'archived_count'):
+            if name in self.__dict__:
+                feed.__dict__[name] = self.__dict__[name]
+        return feed
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError('ArchivedFeed поддерживает только срезы.')
+        first, second = self.hot, self.archived
+        first_count = 'hot_count'
+        if self.ascending:
+            first, second = second, first
+            first_count = 'archived_count'
+        start = index.start or 0
+        stop = index.stop
+        # Если Paginator уже посчитал посты, срез за концом первой части
+        # в базу не ходит. Курсорной ленте счётчики не нужны вовсе.
+        known = self.__dict__.get(first_count)
+        rows = list(first[start:stop]) if known is None or (
+            start < known) else []
+        if stop is not None and len(rows) == stop - start:
+            return rows
+        # Первая часть кончилась: срез продолжается во второй.
+        offset = 0 if rows or not start else start - getattr(self,
+                                                             first_count)
+        if stop is None:
+            return rows + list(second[offset:])
+        return rows + list(second[offset:offset + stop - start - len(rows)])
+
+
+def with_archive(queryset):
+    """Лента queryset, продолженная архивными постами."""
+
+    if not settings.ARCHIVE_DATABASE:
+        return queryset
+    return ArchivedFeed(queryset,
+                        queryset.using(settings.ARCHIVE_DATABASE))
+
+
+def get_post(queryset, pk):
+    """Пост из основной базы или из архива; иначе Http404.
+
+    Автор архивного поста перечитывается из основной базы: в архиве
+    лежит его копия на момент переноса.
+    """
+
+    for database in databases():
+        if database != DEFAULT_DB_ALIAS:
+            queryset = queryset.using(database)
+        # Свежий пост читается через роутер: GET-страница берёт его с
+        # реплики.
+        post = queryset.filter(pk=pk).first()
+        if post is None:
+            continue
+        if database != DEFAULT_DB_ALIAS:
+            post.author = User.objects.select_related('stats').get(
+                pk=post.author_id)
+        return post
+    raise Http404('Пост не найден.')
+
+
+def _copy(model, objects, fields):
+    """Копирует строки в архив: новые создаёт, существующие обновляет."""
+
+    using = settings.ARCHIVE_DATABASE
+    existing = set(model._base_manager.using(using).filter(
+        pk__in=[obj.pk for obj in objects]).values_list('pk', flat=True))
+    model._base_manager.using(using).bulk_create(
+        [obj for obj in objects if obj.pk not in existing])
+    if fields:
+        model._base_manager.using(using).bulk_update(
+            [obj for obj in objects if obj.pk in existing], fields)
+
+
+def _insert(model, objects, date_field):
+    """Вставляет строки в архив, сохраняя их даты."""
+
+    using = settings.ARCHIVE_DATABASE
+    dates = [getattr(obj, date_field) for obj in objects]
+    # bulk_create заполняет поле auto_now_add текущим временем.
+    model.objects.using(using).bulk_create(objects, ignore_conflicts=True)
+    for obj, date in zip(objects, dates):
+        setattr(obj, date_field, date)
+    model.objects.using(using).bulk_update(objects, [date_field])
+
+
+def archive_batch(posts):
+    """Переносит посты posts и их комментарии в архив.
+
+    Посты перечитываются, копируются и удаляются в одной транзакции
+    основной базы под блокировкой: комментарий или правка, сделанные во
+    время переноса, не потеряются, а дождутся его конца или получат
+    ошибку. Архив коммитится раньше основной базы, поэтому прерванный
+    перенос безопасно повторить.
+    """
+
+    using = settings.ARCHIVE_DATABASE
+    with transaction.atomic():
+        posts = list(Post.objects.select_for_update().filter(
+            pk__in=[post.pk for post in posts]).order_by('pk'))
+        ids = [post.pk for post in posts]
+        comments = list(Comment.objects.filter(post_id__in=ids))
+        user_ids = ({post.author_id for post in posts}
+                    | {comment.author_id for comment in comments})
+        group_ids = {post.group_id for post in posts} - {None}
+        users = list(User.objects.filter(pk__in=user_ids))
+        for user in users:
+            # Копия нужна для внешних ключей и имён в лентах, не для входа.
+            user.password = '!'
+        with transaction.atomic(using=using):
+            _copy(User, users, ['username', 'first_name', 'last_name'])
+            _copy(Group, list(Group.objects.filter(pk__in=group_ids)),
+                  ['title', 'slug', 'description'])
+            _insert(Post, posts, 'pub_date')
+            _insert(Comment, comments, 'created')
+        with _moving():
+            Post.objects.filter(pk__in=ids).delete()
+    return len(posts), len(comments)
+
+
+def archive_posts(days=None, batch_size=None, limit=None):
+    """Переносит в архив посты старше days дней пачками по batch_size.
+
+    Вернёт число перенесённых постов и комментариев.
+    """
+
+    if not settings.ARCHIVE_DATABASE:
+        raise ValueError('Архив выключен: не задан ARCHIVE_DATABASE.')
+    if days is None:
+        days = settings.ARCHIVE_AFTER_DAYS
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    before = timezone.now() - timedelta(days=days)
+    posts = Post.objects.filter(pub_date__lt=before).order_by('pk')
+    moved = comments = 0
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size,
+                                                    limit - moved)
+        batch = list(posts[:size])
+        if not batch:
+            break
+        batch_posts, batch_comments = archive_batch(batch)
+        moved += batch_posts
+        comments += batch_comments
+    return moved, comments
@@ -0,0 +1,42 @@
+"""Версии закэшированных фрагментов ленты.
+
+Ключ фрагмента главной страницы содержит номер поколения. Сигналы
+моделей увеличивают его, и все старые фрагменты сразу становятся
+недоступны, поэтому сами фрагменты можно хранить часами.
+"""
+import time
+
+from django.core.cache import cache
+
+INDEX_VERSION_KEY = 'posts:index:version'
+
+
+def _initial_version():
+    # Если ключ версии вытеснен из кэша, новая версия не должна совпасть
+    # ни с одной из старых, поэтому отсчёт начинается с текущего времени.
+    return int(time.time() * 1000)
+
+
+def index_version():
+    """Текущее поколение фрагментов главной страницы."""
+
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(INDEX_VERSION_KEY, _initial_version(), timeout=None)
+        version = cache.get(INDEX_VERSION_KEY)
+    return version
+
+
+def bump_index_version():
+    """Делает недействительными все фрагменты главной страницы."""
+
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        cache.add(INDEX_VERSION_KEY, _initial_version(), timeout=None)
+
+
+def page_key(page_obj):
+    """Часть ключа фрагмента, различающая страницы ленты."""
+
+    return getattr(page_obj, 'cache_key', None) or page_obj.number
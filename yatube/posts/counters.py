@@ -0,0 +1,131 @@
+"""Денормализованные счётчики пользователя (таблица AuthorStats).
+
+Счётчики меняются атомарным UPDATE ... SET n = n + 1 из сигналов,
+а если строки ещё нет, она создаётся пересчётом по исходным таблицам.
+Посты и комментарии, перенесённые в архив, тоже учитываются.
+При удалении строка не создаётся: удаление может быть каскадным
+вслед за самим пользователем.
+"""
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F
+
+from . import archive
+from .models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+COUNTERS = {
+    'posts_count': (Post, 'author_id'),
+    'comments_count': (Comment, 'author_id'),
+    'followers_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+}
+
+
+def _bump(user_id, field, delta):
+    if user_id is None:
+        return
+    updated = AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta})
+    if not updated and delta > 0:
+        create_stats(user_id)
+
+
+def post_added(post):
+    _bump(post.author_id, 'posts_count', 1)
+
+
+def post_removed(post):
+    _bump(post.author_id, 'posts_count', -1)
+
+
+def comment_added(comment):
+    _bump(comment.author_id, 'comments_count', 1)
+
+
+def comment_removed(comment):
+    _bump(comment.author_id, 'comments_count', -1)
+
+
+def follow_added(follow):
+    _bump(follow.author_id, 'followers_count', 1)
+    _bump(follow.user_id, 'following_count', 1)
+
+
+def follow_removed(follow):
+    _bump(follow.author_id, 'followers_count', -1)
+    _bump(follow.user_id, 'following_count', -1)
+
+
+def _databases(model):
+    if model in archive.ARCHIVED_MODELS:
+        return archive.databases()
+    return [DEFAULT_DB_ALIAS]
+
+
+def create_stats(user_id):
+    """Создаёт строку счётчиков пользователя пересчётом и вернёт её.
+
+    Строку, которую успел создать параллельный запрос, не трогает.
+    """
+
+    stats = AuthorStats(user_id=user_id)
+    for field, (model, column) in COUNTERS.items():
+        setattr(stats, field, sum(
+            model.objects.using(database).filter(**{column: user_id}).count()
+            for database in _databases(model)
+        ))
+    AuthorStats.objects.bulk_create([stats], ignore_conflicts=True)
+    return stats
+
+
+def get_stats(user):
+    """Вернёт счётчики пользователя, при необходимости создав их."""
+
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return create_stats(user.pk)
+
+
+def reconcile(users=None, batch_size=1000):
+    """Пересчитывает счётчики и исправляет расхождения.
+
+    Вернёт число созданных или исправленных строк.
+    """
+
+    if users is None:
+        users = User.objects.all()
+    user_ids = list(users.order_by('pk').values_list('pk', flat=True))
+    repaired = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        actual = {pk: AuthorStats(user_id=pk) for pk in batch}
+        for field, (model, column) in COUNTERS.items():
+            for database in _databases(model):
+                rows = (
+                    model.objects.using(database)
+                    .filter(**{f'{column}__in': batch})
+                    .values(column)
+                    .annotate(total=Count('pk'))
+                    .order_by()
+                    .values_list(column, 'total')
+                )
+                for pk, total in rows:
+                    setattr(actual[pk], field,
+                            getattr(actual[pk], field) + total)
+        stored = AuthorStats.objects.in_bulk(batch)
+        missing = [stats for pk, stats in actual.items()
+                   if pk not in stored]
+        changed = [
+            stats for pk, stats in actual.items()
+            if pk in stored and any(
+                getattr(stats, field) != getattr(stored[pk], field)
+                for field in COUNTERS
+            )
+        ]
+        AuthorStats.objects.bulk_create(missing, ignore_conflicts=True)
+        AuthorStats.objects.bulk_update(changed, list(COUNTERS))
+        repaired += len(missing) + len(changed)
+    return repaired
@@ -16,6 +16,20 @@ class PostForm(forms.ModelForm):
             'group': 'Группа',
         }
 
+    def __init__(self, *args, upload_error=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_error = upload_error
+
+    def clean_image(self):
+        if self.upload_error:
+            raise forms.ValidationError(self.upload_error)
+        return self.cleaned_data['image']
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            self.instance.update_image_metadata()
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
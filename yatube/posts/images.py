@@ -0,0 +1,68 @@
+"""Сведения о картинке поста, которые сохраняются в самом посте.
+
+Размеры, формат, основной цвет и размытая заглушка (LQIP) считаются
+один раз при загрузке, чтобы ленты выводили разметку картинки,
+не открывая файл.
+"""
+import base64
+from io import BytesIO
+
+from PIL import Image, ImageFilter
+
+# Сторона уменьшенной копии, по которой ищется основной цвет.
+COLOR_SAMPLE = 64
+COLOR_PALETTE = 8
+# Заглушка - JPEG такого размера в data-URI, около 300 байт.
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 40
+
+
+def dominant_color(image):
+    """Самый частый цвет картинки после сведения к малой палитре."""
+
+    sample = image.convert('RGB')
+    sample.thumbnail((COLOR_SAMPLE, COLOR_SAMPLE))
+    palette_image = sample.quantize(colors=COLOR_PALETTE)
+    _, index = max(palette_image.getcolors())
+    palette = palette_image.getpalette()
+    red, green, blue = palette[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def placeholder(image):
+    """Крошечная размытая копия картинки в виде data-URI."""
+
+    sample = image.convert('RGB')
+    sample.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    sample = sample.filter(ImageFilter.GaussianBlur(1))
+    data = BytesIO()
+    sample.save(data, 'JPEG', quality=PLACEHOLDER_QUALITY, optimize=True)
+    return ('data:image/jpeg;base64,'
+            + base64.b64encode(data.getvalue()).decode())
+
+
+def read_metadata(file):
+    """Вернёт поля image_* поста для открытого файла картинки."""
+
+    file.seek(0)
+    with Image.open(file) as image:
+        metadata = {
+            'image_width': image.width,
+            'image_height': image.height,
+            'image_format': image.format or '',
+            'image_color': dominant_color(image),
+            'image_placeholder': placeholder(image),
+        }
+    metadata['image_size'] = file.size
+    file.seek(0)
+    return metadata
+
+
+EMPTY_METADATA = {
+    'image_width': None,
+    'image_height': None,
+    'image_format': '',
+    'image_color': '',
+    'image_placeholder': '',
+    'image_size': None,
+}
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import archive
+
+
+class Command(BaseCommand):
+    help = ('Переносит посты старше ARCHIVE_AFTER_DAYS дней вместе с '
+            'комментариями в архивную базу ARCHIVE_DATABASE. Рассчитана '
+            'на запуск по расписанию, например раз в сутки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='Возраст поста в днях; по умолчанию '
+                                 'ARCHIVE_AFTER_DAYS.')
+        parser.add_argument('--batch-size', type=int,
+                            help='Постов за одну транзакцию; по умолчанию '
+                                 'ARCHIVE_BATCH_SIZE.')
+        parser.add_argument('--limit', type=int,
+                            help='Перенести не больше стольких постов.')
+
+    def handle(self, *args, **options):
+        try:
+            posts, comments = archive.archive_posts(
+                options['days'], options['batch_size'], options['limit'])
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(
+            f'Перенесено в архив постов: {posts}, комментариев: {comments}')
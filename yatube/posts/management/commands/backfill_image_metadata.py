@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+FIELDS = ('image_width', 'image_height', 'image_size', 'image_format',
+          'image_color', 'image_placeholder')
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, формат, основной цвет и заглушку картинок '
+            'у постов, созданных до появления этих полей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать и уже заполненные посты.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only('image', *FIELDS)
+        if not options['all']:
+            posts = posts.filter(image_width__isnull=True)
+        post_ids = list(posts.order_by('pk').values_list('pk', flat=True))
+        batch_size = options['batch_size']
+        updated = failed = 0
+        for start in range(0, len(post_ids), batch_size):
+            batch = []
+            for post in posts.filter(
+                    pk__in=post_ids[start:start + batch_size]):
+                try:
+                    post.update_image_metadata()
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f'{post.image.name}: {error}')
+                    continue
+                finally:
+                    post.image.close()
+                batch.append(post)
+            Post.objects.bulk_update(batch, FIELDS)
+            updated += len(batch)
+        self.stdout.write(f'Обновлено постов: {updated}, с ошибками: {failed}')
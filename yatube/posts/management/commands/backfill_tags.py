@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts import tags
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Раскладывает по хэштегам посты, созданные до появления '
+            'тегов. Существующие связи не удаляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.filter(text__contains='#').only(
+            'text', 'pub_date').order_by('pk')
+        batch_size = options['batch_size']
+        last_pk = 0
+        processed = entries = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            entries += tags.backfill(batch)
+            processed += len(batch)
+            last_pk = batch[-1].pk
+        self.stdout.write(
+            f'Обработано постов: {processed}, связей с тегами: {entries}')
@@ -0,0 +1,141 @@
+import os
+from html.parser import HTMLParser
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+# Страница рендерится без кэшей: иначе оба варианта получат один и тот
+# же закэшированный HTML. Без кэша миниатюры ищутся в БД по одной, поэтому
+# бюджет запросов при замере не проверяется.
+NO_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def choose_candidate(srcset, width):
+    """Вариант из srcset, который браузер скачает для ширины width.
+
+    Это наименьший вариант не уже width, а если такого нет - самый
+    широкий.
+    """
+
+    candidates = []
+    for candidate in srcset.split(','):
+        url, _, descriptor = candidate.strip().partition(' ')
+        descriptor = descriptor.strip()
+        size = int(descriptor[:-1]) if descriptor.endswith('w') else 0
+        candidates.append((size, url))
+    candidates.sort()
+    for size, url in candidates:
+        if size >= width:
+            return url
+    return candidates[-1][1]
+
+
+class ImageCollector(HTMLParser):
+    """Собирает картинки страницы: адрес, который скачает браузер, и
+    признак ленивой загрузки.
+
+    Внутри <picture> берётся первый <source>: браузер считается
+    поддерживающим все форматы. Из srcset выбирается вариант для
+    ширины width.
+    """
+
+    def __init__(self, width):
+        super().__init__()
+        self.width = width
+        self.images = []
+        self.sources = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'source' and attrs.get('srcset'):
+            self.sources.append(attrs['srcset'])
+        elif tag == 'img' and attrs.get('src'):
+            srcset = self.sources[0] if self.sources else attrs.get('srcset')
+            url = (choose_candidate(srcset, self.width) if srcset
+                   else attrs['src'])
+            self.images.append((url, attrs.get('loading') == 'lazy'))
+            self.sources = []
+
+
+def file_size(url):
+    """Размер файла по адресу из MEDIA_URL или STATIC_URL, иначе None."""
+
+    path = unquote(urlsplit(url).path)
+    if path.startswith(settings.MEDIA_URL):
+        full_path = os.path.join(settings.MEDIA_ROOT,
+                                 path[len(settings.MEDIA_URL):])
+    elif path.startswith(settings.STATIC_URL):
+        full_path = finders.find(path[len(settings.STATIC_URL):])
+    else:
+        return None
+    if full_path and os.path.isfile(full_path):
+        return os.path.getsize(full_path)
+    return None
+
+
+class Command(BaseCommand):
+    help = ('Считает байты, которые браузер скачивает при открытии '
+            'страницы: HTML и картинки первого экрана. Страница '
+            'рендерится дважды: без ленивой загрузки и размытых '
+            'заглушек и с ними.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', nargs='?',
+                            help='Адрес страницы, по умолчанию главная.')
+        parser.add_argument(
+            '--fold', type=int, default=1,
+            help='Сколько картинок видно на первом экране.')
+        parser.add_argument(
+            '--width', type=int, default=960,
+            help='Ширина картинки на экране в пикселях для выбора '
+                 'варианта из srcset.')
+
+    def measure(self, url, lazy, fold, width):
+        """Вернёт размер HTML, байты картинок при открытии, список
+        картинок и число не найденных файлов."""
+
+        with override_settings(POST_IMAGE_LAZY=lazy, CACHES=NO_CACHES,
+                               QUERY_BUDGET_ENABLED=False):
+            response = Client().get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url}: ответ {response.status_code}')
+        collector = ImageCollector(width)
+        collector.feed(response.content.decode(response.charset or 'utf-8'))
+        fetched = missing = 0
+        for index, (src, is_lazy) in enumerate(collector.images):
+            if is_lazy and index >= fold:
+                # Ленивая картинка ниже первого экрана не скачивается.
+                continue
+            size = file_size(src)
+            if size is None:
+                missing += 1
+            else:
+                fetched += size
+        return len(response.content), fetched, collector.images, missing
+
+    def handle(self, *args, **options):
+        url = options['url'] or reverse('posts:index')
+        fold, width = options['fold'], options['width']
+        results = []
+        for title, lazy in (('Без ленивой загрузки и заглушек', False),
+                            ('С ленивой загрузкой и заглушками', True)):
+            html, fetched, images, missing = self.measure(url, lazy, fold,
+                                                          width)
+            self.stdout.write(f'{title}: HTML {html} байт, картинки '
+                              f'{fetched} байт, всего {html + fetched}')
+            if missing:
+                self.stdout.write(f'Не найдено файлов картинок: {missing}')
+            results.append(html + fetched)
+        before, after = results
+        self.stdout.write(f'{url}: картинок {len(images)}, из них ленивых '
+                          f'{sum(is_lazy for _, is_lazy in images)}')
+        if before:
+            self.stdout.write(f'Экономия при открытии: '
+                              f'{1 - after / before:.1%}')
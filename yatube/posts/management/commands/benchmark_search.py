@@ -0,0 +1,85 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+# Таблицы, которые читают запросы поиска, в том же виде, что после
+# миграций, но только с нужными запросам столбцами.
+SCHEMA = """
+CREATE TABLE posts_post (id INTEGER PRIMARY KEY, text TEXT NOT NULL);
+CREATE TABLE posts_comment (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER,
+    text TEXT NOT NULL
+);
+CREATE INDEX posts_comment_post_id ON posts_comment (post_id);
+CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+    text, content='posts_post', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2');
+CREATE VIRTUAL TABLE posts_comment_fts USING fts5(
+    text, content='posts_comment', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2');
+"""
+TEXT = ('Сегодня {number} снова про погоду: дождь, ветер и лужи во дворе, '
+        'а завтра обещают солнце. ') * 4
+WORD = 'погоду'
+
+
+class Command(BaseCommand):
+    help = ('Замеряет, как время первой страницы поиска по частому слову '
+            'растёт с числом совпадений: отдельно ранжирование и весь '
+            'запрос с фрагментами текста.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[1_000, 10_000, 50_000],
+                            help='Число постов, в каждом есть слово.')
+        parser.add_argument('--per-page', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def prepare(self, db, size):
+        db.executescript(SCHEMA)
+        db.executemany('INSERT INTO posts_post (id, text) VALUES (?, ?)', (
+            (number, TEXT.format(number=number))
+            for number in range(1, size + 1)))
+        db.executemany(
+            'INSERT INTO posts_comment (post_id, text) VALUES (?, ?)',
+            ((number, f'И в комментарии про погоду {number}')
+             for number in range(1, size + 1, 10)))
+        for table in search.INDEXES:
+            db.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+    def timed(self, db, sql, params, repeat):
+        """Лучшее время запроса из repeat попыток, в миллисекундах."""
+
+        sql = sql.replace('%s', '?')
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            db.execute(sql, params).fetchall()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000
+
+    def handle(self, *args, **options):
+        match = search.match_expression(WORD)
+        rank_params = [match, match, float('-inf'), 0,
+                       options['per_page'] + 1]
+        self.stdout.write(f'{"posts":>8} {"rank, ms":>10} '
+                          f'{"search, ms":>11} {"snippets, ms":>13}')
+        for size in options['sizes']:
+            db = sqlite3.connect(':memory:')
+            try:
+                self.prepare(db, size)
+                rank = self.timed(db, search.RANK_SQL, rank_params,
+                                  options['repeat'])
+                total = self.timed(db, search.SEARCH_SQL,
+                                   rank_params + [match, match],
+                                   options['repeat'])
+            finally:
+                db.close()
+            # Ранжирование читает все совпадения, а фрагменты строятся
+            # только для постов страницы.
+            self.stdout.write(f'{size:>8} {rank:>10.1f} {total:>11.1f} '
+                              f'{total - rank:>13.1f}')
@@ -0,0 +1,65 @@
+import os
+import shutil
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.signals import purge_image_pages
+from posts.storage import content_hash
+
+
+class Command(BaseCommand):
+    help = ('Переводит картинки постов на имена по содержимому: копии '
+            'одного файла сводятся к одному оригиналу, а старые файлы '
+            'и их миниатюры удаляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, ничего не менять.')
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        names = (Post.objects.exclude(image='').order_by('image')
+                 .values_list('image', flat=True).distinct())
+        moved = duplicates = missing = reclaimed = 0
+        for name in names:
+            if not storage.exists(name):
+                missing += 1
+                continue
+            with storage.open(name) as file:
+                digest = content_hash(file)
+            target = storage.content_name(
+                os.path.join(field.upload_to, os.path.basename(name)),
+                digest)
+            if target == name:
+                continue
+            if storage.exists(target):
+                duplicates += 1
+                reclaimed += storage.size(name)
+            else:
+                moved += 1
+            if options['dry_run']:
+                continue
+            if not storage.exists(target):
+                self.link(storage.path(name), storage.path(target))
+            with transaction.atomic():
+                Post.objects.filter(image=name).update(image=target)
+            # update() не шлёт сигналы: страницы со старым именем
+            # сбрасываются здесь.
+            purge_image_pages(target)
+            storage.release(name)
+        prefix = 'Пробный запуск. ' if options['dry_run'] else ''
+        self.stdout.write(
+            f'{prefix}Переименовано: {moved}, слито копий: {duplicates}, '
+            f'освобождено байт: {reclaimed}, нет файла: {missing}')
+
+    def link(self, source, target):
+        # Новое имя появляется раньше, чем на него переключаются посты,
+        # поэтому прерванный запуск не оставит ссылок на пропавший файл.
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
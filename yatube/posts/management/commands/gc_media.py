@@ -0,0 +1,133 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts import archive
+from posts.models import Post
+
+
+def scan_tree(path):
+    """Файлы под path: список (путь, размер, время изменения)."""
+
+    files = []
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+    return files
+
+
+def scan(root, workers):
+    """Параллельный обход: каждый подкаталог root - отдельная задача."""
+
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return []
+    files = [(entry.path, entry.stat().st_size, entry.stat().st_mtime)
+             for entry in entries if entry.is_file(follow_symlinks=False)]
+    directories = [entry.path for entry in entries
+                   if entry.is_dir(follow_symlinks=False)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for subtree in executor.map(scan_tree, directories):
+            files.extend(subtree)
+    return files
+
+
+class Command(BaseCommand):
+    help = ('Удаляет оригиналы картинок, на которые не ссылается ни один '
+            'пост, и миниатюры sorl-thumbnail, которых нет в key-value '
+            'хранилище у живых картинок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено.')
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Не больше стольких удалений в секунду.')
+        parser.add_argument(
+            '--min-age', type=float, default=3600,
+            help='Не трогать файлы моложе стольких секунд: они могут '
+                 'принадлежать загрузке, которая ещё не закоммичена.')
+        parser.add_argument('--workers', type=int, default=8)
+
+    def live_thumbnails(self, storage, names):
+        """Имена миниатюр, которые хранилище sorl знает у картинок names."""
+
+        kvstore = default.kvstore
+        live = set()
+        for name in names:
+            source = ImageFile(name, storage)
+            # У хранилища sorl нет публичного списка миниатюр картинки.
+            for key in kvstore._get(source.key, identity='thumbnails') or []:
+                thumbnail = kvstore._get(key)
+                if thumbnail is None:
+                    continue
+                live.add(thumbnail.name)
+                base, extension = os.path.splitext(thumbnail.name)
+                for resolution in (
+                        sorl_settings.THUMBNAIL_ALTERNATIVE_RESOLUTIONS):
+                    live.add(f'{base}@{resolution}x{extension}')
+        return live
+
+    def find_orphans(self, field, deadline, workers):
+        storage = field.storage
+        root = storage.location
+        referenced = set()
+        for database in archive.databases():
+            referenced.update(Post.objects.using(database).exclude(image='')
+                              .values_list('image', flat=True))
+        live = self.live_thumbnails(storage, referenced)
+        orphans = []
+        # Миниатюры идут первыми: при удалении оригинала sorl удаляет
+        # и его миниатюры, и их размер не попал бы в отчёт.
+        for directory, keep in (
+            (sorl_settings.THUMBNAIL_PREFIX, live),
+            (field.upload_to, referenced),
+        ):
+            for path, size, mtime in scan(os.path.join(root, directory),
+                                          workers):
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if name not in keep and mtime < deadline:
+                    orphans.append((name, size))
+        return orphans
+
+    def delete(self, field, name):
+        storage = field.storage
+        if name.startswith(field.upload_to):
+            # Заодно убираются ссылки sorl на эту картинку и её миниатюры.
+            default.kvstore.delete(ImageFile(name, storage))
+        try:
+            os.remove(storage.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        deadline = time.time() - options['min_age']
+        orphans = self.find_orphans(field, deadline, options['workers'])
+        reclaimed = 0
+        for name, size in orphans:
+            if options['dry_run']:
+                self.stdout.write(f'Будет удалён {name} ({size} байт)')
+                reclaimed += size
+            elif self.delete(field, name):
+                reclaimed += size
+                if options['rate']:
+                    time.sleep(1 / options['rate'])
+        prefix = 'Пробный запуск. ' if options['dry_run'] else ''
+        self.stdout.write(f'{prefix}Файлов: {len(orphans)}, '
+                          f'освобождено байт: {reclaimed}')
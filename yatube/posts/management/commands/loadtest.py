@@ -0,0 +1,423 @@
+import copy
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.query_budget import QueryCounter
+from posts import counters, tags, timeline
+from posts.models import Comment, Follow, Group, Post, Tag
+
+User = get_user_model()
+
+# Доля запросов к каждой странице по умолчанию.
+WEIGHTS = {
+    'posts:index': 30,
+    'posts:group_list': 15,
+    'posts:profile': 15,
+    'posts:post_detail': 25,
+    'posts:follow_index': 5,
+    'posts:add_comment': 5,
+    'posts:post_create': 5,
+}
+LOGIN_REQUIRED = {'posts:follow_index', 'posts:add_comment',
+                  'posts:post_create'}
+# Ответ, который считается успешным; для остальных страниц - 200.
+EXPECTED_STATUS = {'posts:add_comment': 302, 'posts:post_create': 302}
+BATCH_SIZE = 500
+TAGS = 20
+
+
+def percentile(values, percent):
+    """Перцентиль отсортированного списка по методу ближайшего ранга."""
+
+    if not values:
+        return None
+    rank = math.ceil(percent / 100 * len(values))
+    return values[max(rank, 1) - 1]
+
+
+def git_revision():
+    """Коммит, на котором запущен тест, или None вне git."""
+
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_weights(values):
+    """Веса из аргументов вида posts:index=30 поверх WEIGHTS."""
+
+    weights = dict(WEIGHTS)
+    for value in values or ():
+        name, _, weight = value.partition('=')
+        if name not in WEIGHTS:
+            raise CommandError(f'Неизвестная страница: {name}')
+        try:
+            weights[name] = int(weight)
+        except ValueError:
+            raise CommandError(f'Вес должен быть числом: {value}')
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def summarize(samples, elapsed):
+    """Сводка по страницам и общий итог под ключом 'total'."""
+
+    groups = {}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+    groups = dict(sorted(groups.items()))
+    groups['total'] = samples
+    results = {}
+    for name, group in groups.items():
+        latencies = sorted(sample[1] * 1000 for sample in group)
+        queries = [sample[2] for sample in group]
+        results[name] = {
+            'requests': len(group),
+            'errors': sum(not sample[3] for sample in group),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'max_ms': round(latencies[-1], 3),
+            'throughput_rps': round(len(group) / elapsed, 3),
+            'queries_per_request': round(sum(queries) / len(queries), 3),
+            'queries_max': max(queries),
+        }
+    return results
+
+
+class Dataset:
+    """Пользователи, группы и посты, созданные для нагрузки.
+
+    Имена и slug начинаются с префикса прогона, поэтому в рабочей базе
+    набор не смешивается с чужими строками и удаляется целиком.
+    """
+
+    def __init__(self, rng, options):
+        self.rng = rng
+        self.options = options
+        self.prefix = f'load-{uuid.uuid4().hex[:8]}-'
+        self.last_tag = None
+
+    def seed(self):
+        options = self.options
+        prefix = self.prefix
+        self.last_tag = Tag.objects.aggregate(last=Max('pk'))['last'] or 0
+        User.objects.bulk_create(
+            [User(username=f'{prefix}{number}')
+             for number in range(options['users'])],
+            batch_size=BATCH_SIZE)
+        self.users = list(User.objects.filter(
+            username__startswith=prefix).order_by('pk'))
+        Group.objects.bulk_create(
+            [Group(title=f'Группа {number}', slug=f'{prefix}{number}',
+                   description='Группа для нагрузочного теста')
+             for number in range(options['groups'])],
+            batch_size=BATCH_SIZE)
+        self.groups = list(Group.objects.filter(
+            slug__startswith=prefix).order_by('pk'))
+        self.seed_posts()
+        self.seed_comments()
+        self.seed_follows()
+        counters.reconcile()
+        tags.backfill(self.posts)
+        for user in self.users:
+            timeline.rebuild(user)
+
+    def seed_posts(self):
+        rng = self.rng
+        groups = self.groups + [None]
+        Post.objects.bulk_create(
+            [Post(author=rng.choice(self.users), group=rng.choice(groups),
+                  text=f'Пост {number} #тег{number % TAGS}')
+             for number in range(self.options['posts'])],
+            batch_size=BATCH_SIZE)
+        self.posts = list(Post.objects.filter(
+            author__in=self.users).order_by('pk'))
+        # Посты появляются раз в минуту, самый новый - последний.
+        now = timezone.now()
+        for age, post in enumerate(reversed(self.posts)):
+            post.pub_date = now - timedelta(minutes=age)
+        Post.objects.bulk_update(self.posts, ['pub_date'],
+                                 batch_size=BATCH_SIZE)
+
+    def seed_comments(self):
+        rng = self.rng
+        Comment.objects.bulk_create(
+            [Comment(post=rng.choice(self.posts),
+                     author=rng.choice(self.users),
+                     text=f'Комментарий {number}')
+             for number in range(self.options['comments'])],
+            batch_size=BATCH_SIZE)
+
+    def seed_follows(self):
+        follows = []
+        for user in self.users:
+            others = [author for author in self.users if author != user]
+            for author in self.rng.sample(
+                    others, min(self.options['follows'], len(others))):
+                follows.append(Follow(user=user, author=author))
+        Follow.objects.bulk_create(follows, batch_size=BATCH_SIZE,
+                                   ignore_conflicts=True)
+
+    def delete(self):
+        """Удаляет всё, что создал прогон, вместе с постами и
+        комментариями, написанными под нагрузкой."""
+
+        if self.last_tag is None:
+            return
+        # Посты, комментарии, подписки и ленты удаляются каскадом.
+        User.objects.filter(username__startswith=self.prefix).delete()
+        Group.objects.filter(slug__startswith=self.prefix).delete()
+        Tag.objects.filter(pk__gt=self.last_tag, entries=None).delete()
+
+    def request(self, name, anonymous):
+        """Запрос к странице name: (метод, адрес, данные, с входом)."""
+
+        rng = self.rng
+        post = rng.choice(self.posts)
+        if name == 'posts:group_list':
+            url = reverse(name, args=(rng.choice(self.groups).slug,))
+        elif name == 'posts:profile':
+            url = reverse(name, args=(rng.choice(self.users).username,))
+        elif name in ('posts:post_detail', 'posts:add_comment'):
+            url = reverse(name, args=(post.pk,))
+        else:
+            url = reverse(name)
+        if name == 'posts:add_comment':
+            return 'post', url, {'text': 'Комментарий под нагрузкой'}, True
+        if name == 'posts:post_create':
+            text = f'Пост под нагрузкой #тег{rng.randrange(TAGS)}'
+            return 'post', url, {'text': text}, True
+        authorized = name in LOGIN_REQUIRED or rng.random() >= anonymous
+        return 'get', url, None, authorized
+
+
+class Worker(threading.Thread):
+    """Поток, который выполняет свою часть плана запросов."""
+
+    def __init__(self, plan, user):
+        super().__init__(daemon=True)
+        self.plan = plan
+        self.anonymous_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(user)
+        self.samples = []
+        self.error = None
+
+    def execute(self, name, method, url, data, authorized):
+        client = (self.authorized_client if authorized
+                  else self.anonymous_client)
+        counter = QueryCounter()
+        with connections['default'].execute_wrapper(counter):
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            elapsed = time.perf_counter() - started
+        ok = response.status_code == EXPECTED_STATUS.get(name, 200)
+        return name, elapsed, counter.count, ok
+
+    def run_plan(self):
+        try:
+            for request in self.plan:
+                self.samples.append(self.execute(*request))
+        except Exception as error:
+            self.error = error
+
+    def run(self):
+        try:
+            self.run_plan()
+        finally:
+            connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест страниц сайта. Создаёт во временной базе '
+            'набор пользователей, групп, постов и комментариев, гоняет '
+            'взвешенную смесь запросов тестовым клиентом Django из '
+            'нескольких потоков и сохраняет задержки p50/p95/p99, '
+            'пропускную способность и число SQL-запросов на страницу в '
+            'JSON, чтобы сравнивать прогоны на разных коммитах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=4000)
+        parser.add_argument('--follows', type=int, default=5,
+                            help='Подписок у каждого пользователя.')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--warmup', type=int, default=50,
+                            help='Запросов до замеров, они не учитываются.')
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--anonymous', type=float, default=0.5,
+                            help='Доля GET-запросов без входа на сайт.')
+        parser.add_argument('--weight', action='append', metavar='NAME=N',
+                            help='Вес страницы, например posts:index=30.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='loadtest.json')
+        parser.add_argument('--compare', metavar='JSON',
+                            help='Результат прошлого прогона для сравнения.')
+        parser.add_argument(
+            '--in-place', action='store_true',
+            help=('Заполнять и нагружать текущую базу, а не временную; '
+                  'созданные строки удаляются после прогона.'))
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or not options['users']:
+            raise CommandError('Нужны хотя бы один поток и пользователь.')
+        weights = parse_weights(options['weight'])
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(DEBUG=False, QUERY_BUDGET_ENABLED=False,
+                                   CACHES=self.caches(directory)):
+                if options['in_place']:
+                    report = self.benchmark(weights, options)
+                else:
+                    report = self.run_in_temporary_database(
+                        directory, weights, options)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, sort_keys=True,
+                      ensure_ascii=False)
+            file.write('\n')
+        self.print_report(report)
+        if options['compare']:
+            self.print_comparison(report, options['compare'])
+        self.stdout.write(f'Результат сохранён в {options["output"]}')
+
+    def caches(self, directory):
+        # Файловые кэши переезжают во временный каталог: прогон
+        # начинается с пустого кэша и не трогает кэш сайта.
+        caches = copy.deepcopy(settings.CACHES)
+        for alias, config in caches.items():
+            if os.path.isabs(config.get('LOCATION', '')):
+                config['LOCATION'] = os.path.join(directory,
+                                                  f'{alias}.cache')
+        return caches
+
+    def run_in_temporary_database(self, directory, weights, options):
+        connection = connections['default']
+        test_settings = connection.settings_dict['TEST']
+        old_test_name = test_settings['NAME']
+        test_settings['NAME'] = os.path.join(directory, 'loadtest.sqlite3')
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            return self.benchmark(weights, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = old_test_name
+
+    def benchmark(self, weights, options):
+        rng = random.Random(options['seed'])
+        dataset = Dataset(rng, options)
+        started_at = timezone.now()
+        started = time.perf_counter()
+        try:
+            dataset.seed()
+            seed_seconds = time.perf_counter() - started
+            cache.clear()
+            names = rng.choices(list(weights), list(weights.values()),
+                                k=options['warmup'] + options['requests'])
+            plan = [(name, *dataset.request(name, options['anonymous']))
+                    for name in names]
+            self.drive(plan[:options['warmup']], dataset, options)
+            started = time.perf_counter()
+            samples = self.drive(plan[options['warmup']:], dataset, options)
+            elapsed = time.perf_counter() - started
+        finally:
+            if options['in_place']:
+                dataset.delete()
+        return {
+            'meta': {
+                'revision': git_revision(),
+                'started': started_at.isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connections['default'].vendor,
+                'seed_seconds': round(seed_seconds, 3),
+                'elapsed_seconds': round(elapsed, 3),
+            },
+            'options': {
+                key: options[key] for key in (
+                    'users', 'groups', 'posts', 'comments', 'follows',
+                    'requests', 'warmup', 'threads', 'anonymous', 'seed')
+            },
+            'weights': weights,
+            'results': summarize(samples, elapsed),
+        }
+
+    def drive(self, plan, dataset, options):
+        """Выполняет план в options['threads'] потоках."""
+
+        threads = options['threads']
+        workers = [
+            Worker(plan[number::threads],
+                   dataset.users[number % len(dataset.users)])
+            for number in range(threads)
+        ]
+        if threads == 1:
+            # Один поток работает в текущем: так команда видит данные
+            # незакоммиченной транзакции, например в тестах.
+            workers[0].run_plan()
+        else:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        for worker in workers:
+            if worker.error is not None:
+                raise CommandError(f'Ошибка в потоке: {worker.error!r}')
+        return [sample for worker in workers for sample in worker.samples]
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"page":<20} {"requests":>8} {"errors":>6} {"p50 ms":>8} '
+            f'{"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"queries":>8}')
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f'{name:<20} {result["requests"]:>8} {result["errors"]:>6} '
+                f'{result["p50_ms"]:>8.1f} {result["p95_ms"]:>8.1f} '
+                f'{result["p99_ms"]:>8.1f} {result["throughput_rps"]:>8.1f} '
+                f'{result["queries_per_request"]:>8.1f}')
+
+    def print_comparison(self, report, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                previous = json.load(file)['results']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        self.stdout.write(f'Сравнение с {path} (p95 и запросы):')
+        for name, result in report['results'].items():
+            old = previous.get(name)
+            if old is None:
+                continue
+            change = result['p95_ms'] / old['p95_ms'] - 1 if (
+                old['p95_ms']) else 0
+            self.stdout.write(
+                f'{name:<20} {old["p95_ms"]:>8.1f} -> '
+                f'{result["p95_ms"]:>8.1f} ms ({change:+.0%}), '
+                f'{old["queries_per_request"]:.1f} -> '
+                f'{result["queries_per_request"]:.1f} запросов')
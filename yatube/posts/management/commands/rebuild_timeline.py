@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованную ленту подписок пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*')
+        parser.add_argument('--all', action='store_true',
+                            help='Пересобрать ленты всех пользователей.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            users = User.objects.all()
+        elif options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(
+                users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(
+                    f'Пользователи не найдены: {", ".join(sorted(missing))}')
+        else:
+            raise CommandError('Укажите имена пользователей или --all.')
+        for user in users.iterator():
+            timeline.rebuild(user)
+            self.stdout.write(f'{user.username}: '
+                              f'{user.timeline.count()} постов в ленте')
@@ -0,0 +1,105 @@
+import multiprocessing
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+DEFAULT_CHECKPOINT = os.path.join(settings.BASE_DIR,
+                                  'regenerate_thumbnails.checkpoint')
+
+
+def _render(task):
+    name, force = task
+    try:
+        return name, thumbnails.render(name, force), None
+    except Exception as error:
+        return name, None, f'{type(error).__name__}: {error}'
+
+
+class Command(BaseCommand):
+    help = ('Создаёт миниатюры всех размеров из THUMBNAIL_GEOMETRIES для '
+            'картинок постов в несколько процессов и записывает их '
+            'в key-value хранилище sorl-thumbnail. Прерванный запуск '
+            'продолжается с последнего обработанного поста.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 - работать в текущем процессе.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать миниатюры, которые уже есть в хранилище.')
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT)
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, не читая контрольную точку.')
+        parser.add_argument('--chunk-size', type=int, default=8)
+        parser.add_argument('--progress-every', type=int, default=100)
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return int(checkpoint.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def write_checkpoint(self, path, pk):
+        # Запись через временный файл: контрольная точка не испортится,
+        # если команду прервут посреди записи.
+        with open(path + '.tmp', 'w') as checkpoint:
+            checkpoint.write(str(pk))
+        os.replace(path + '.tmp', path)
+
+    def handle(self, *args, **options):
+        path = options['checkpoint']
+        start = 0 if options['restart'] else self.read_checkpoint(path)
+        if start:
+            self.stdout.write(f'Продолжение после поста {start}')
+        rows = list(
+            Post.objects.filter(pk__gt=start).exclude(image='')
+            .order_by('pk').values_list('pk', 'image')
+        )
+        tasks = [(name, options['force']) for _, name in rows]
+        processes = options['processes']
+        if processes:
+            # Процессы-потомки не должны делить соединение с родителем.
+            connections.close_all()
+            pool = multiprocessing.Pool(processes)
+            results = pool.imap(_render, tasks, options['chunk_size'])
+        else:
+            pool = None
+            results = map(_render, tasks)
+
+        done = failed = 0
+        started = time.perf_counter()
+        try:
+            # imap отдаёт результаты по порядку, поэтому всё до pk
+            # текущего поста уже обработано.
+            for (pk, _), (name, result, error) in zip(rows, results):
+                if error is None:
+                    thumbnails.store(name, *result)
+                else:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                done += 1
+                if done % options['progress_every'] == 0:
+                    self.write_checkpoint(path, pk)
+                    self.report(done, len(rows), started)
+        finally:
+            if pool is not None:
+                pool.terminate()
+        if done % options['progress_every']:
+            self.report(done, len(rows), started)
+        if os.path.exists(path):
+            os.remove(path)
+        self.stdout.write(f'Готово: {done}, с ошибками: {failed}')
+
+    def report(self, done, total, started):
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f'{done}/{total} картинок, {rate:.1f} картинок/с')
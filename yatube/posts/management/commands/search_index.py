@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Обслуживает индекс полнотекстового поиска: по умолчанию '
+            'сливает сегменты (optimize), с --rebuild строит его заново.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Перестроить индекс по текущим таблицам.')
+
+    def handle(self, *args, **options):
+        command = 'rebuild' if options['rebuild'] else 'optimize'
+        search.maintain(command)
+        self.stdout.write(f'Индекс поиска: {command} выполнен')
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+def fts_table(table):
+    """SQL индекса FTS5 для поля text таблицы table и его триггеров."""
+
+    return [
+        f"CREATE VIRTUAL TABLE {table}_fts USING fts5("
+        f"text, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {table}_fts(rowid, text) VALUES (new.id, new.text); "
+        f"END",
+        f"CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {table}_fts({table}_fts, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"END",
+        f"CREATE TRIGGER {table}_fts_update AFTER UPDATE OF text "
+        f"ON {table} BEGIN "
+        f"INSERT INTO {table}_fts({table}_fts, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"INSERT INTO {table}_fts(rowid, text) VALUES (new.id, new.text); "
+        f"END",
+        f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')",
+    ]
+
+
+def drop_fts_table(table):
+    return [
+        f'DROP TRIGGER {table}_fts_insert',
+        f'DROP TRIGGER {table}_fts_delete',
+        f'DROP TRIGGER {table}_fts_update',
+        f'DROP TABLE {table}_fts',
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunSQL(fts_table('posts_post'),
+                          drop_fts_table('posts_post')),
+        migrations.RunSQL(fts_table('posts_comment'),
+                          drop_fts_table('posts_comment')),
+    ]
@@ -1,6 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from . import images
+from .storage import post_image_storage
+
 User = get_user_model()
 
 
@@ -15,6 +18,46 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    """Запросы к постам для лент и страниц, без N+1 в шаблонах."""
+
+    IMAGE_FIELDS = (
+        'image', 'image_width', 'image_height', 'image_color',
+        'image_placeholder',
+    )
+    FEED_FIELDS = (
+        'text', 'pub_date', 'author_id', 'group_id', *IMAGE_FIELDS,
+        'author__username', 'author__first_name', 'author__last_name',
+        'group__title', 'group__slug',
+    )
+
+    def for_feed(self):
+        """Посты для лент: автор и группа приходят одним запросом."""
+
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+    def for_profile(self):
+        """Посты для страницы автора: сам автор уже есть в контексте."""
+
+        return self.select_related('group').only(
+            'text', 'pub_date', 'author_id', 'group_id', *self.IMAGE_FIELDS,
+            'group__title', 'group__slug',
+        )
+
+    def for_detail(self):
+        """Пост со всем, что выводит post_detail, включая комментарии."""
+
+        return self.select_related(
+            'author', 'author__stats', 'group'
+        ).prefetch_related(
+            models.Prefetch(
+                'comments',
+                queryset=Comment.objects.select_related('author')
+                .order_by('created', 'pk'),
+            )
+        )
+
+
 class Post(models.Model):
     """Класс описывает поля модели Post и их типы."""
 
@@ -28,19 +71,52 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_image_storage,
         blank=True,
     )
+    # Заполняются update_image_metadata() при загрузке картинки.
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_size = models.PositiveIntegerField(null=True, editable=False)
+    image_format = models.CharField(max_length=10, blank=True,
+                                    editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         """Метакласс сортировки по дате"""
 
         ordering = ['-pub_date']
+        # Ленты фильтруют по автору или группе и сортируют по дате:
+        # индексы отдают строки уже в нужном порядке, без сортировки.
+        indexes = [
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name="post_author_pub_date"),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name="post_group_pub_date"),
+            models.Index(fields=['-pub_date', '-id'],
+                         name="post_pub_date_id"),
+            # По имени файла storage.references() ищет ссылки на него.
+            models.Index(fields=['image'], name="post_image"),
+        ]
 
     def __str__(self):
         """Функция для вывода текста поста."""
 
         return self.text[:15]
 
+    def update_image_metadata(self):
+        """Заполняет поля image_* по файлу картинки, не сохраняя пост."""
+
+        if not self.image:
+            metadata = images.EMPTY_METADATA
+        else:
+            metadata = images.read_metadata(self.image)
+        for field, value in metadata.items():
+            setattr(self, field, value)
+
 
 class Comment(models.Model):
     """Класс описывает поля модели Comment и их типы."""
@@ -52,6 +128,12 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name="comment_post_created"),
+        ]
+
     def __str__(self):
         return self.text[:15]
 
@@ -72,3 +154,78 @@ class Follow(models.Model):
 
     def __str__(self):
         return self.user.username
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="timeline_entries")
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name="+")
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name="unique_timeline_entry")
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name="timeline_user_pub_date"),
+            models.Index(fields=['user', 'author'],
+                         name="timeline_user_author"),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class AuthorStats(models.Model):
+    """Счётчики постов, комментариев и подписок пользователя."""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name="stats")
+    posts_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class Tag(models.Model):
+    """Хэштег из текста постов, без символа # и в нижнем регистре."""
+
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class PostTag(models.Model):
+    """Хэштег поста; pub_date повторяет дату поста для индекса."""
+
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE,
+                            related_name="entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="tag_entries")
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'post'],
+                                    name="unique_post_tag")
+        ]
+        indexes = [
+            models.Index(fields=['tag', '-pub_date', '-post'],
+                         name="post_tag_tag_pub_date"),
+        ]
+
+    def __str__(self):
+        return f'{self.tag_id}: {self.post_id}'
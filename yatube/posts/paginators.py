@@ -0,0 +1,160 @@
+import base64
+import binascii
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+NUMBERED = 'numbered'
+CURSOR = 'cursor'
+# Поля, по которым лента отсортирована: дата и id для равных дат.
+KEYS = ('pub_date', 'pk')
+# То же для лент, которые читаются через таблицу-индекс (TimelineEntry,
+# PostTag): её поля pub_date и post_id добавляются через annotate().
+ENTRY_KEYS = ('entry_pub_date', 'entry_post_id')
+
+
+def encode_cursor(post, keys=KEYS):
+    """Кодирует позицию поста в ленте (pub_date, id) в токен для URL."""
+
+    date_key, id_key = keys
+    raw = f'{getattr(post, date_key).isoformat()}|{getattr(post, id_key)}'
+    raw = raw.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Раскодирует токен курсора. Для испорченного токена вернёт None."""
+
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        pub_date, pk = raw.decode().split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage(Sequence):
+    """Страница ленты, полученная по курсору."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous,
+                 cache_key='first'):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.cache_key = cache_key
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next() or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[-1], self.paginator.keys)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous() or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[0], self.paginator.keys)
+
+
+class CursorPaginator:
+    """Пагинатор по ключу (pub_date, id) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы одинакова: запрос идёт по индексу
+    от позиции курсора и читает ровно per_page + 1 строк. keys - имена
+    полей даты и id, по которым сортируется лента; для лент, читаемых
+    через другую таблицу, это её поля, добавленные через annotate().
+    """
+
+    is_cursor = True
+
+    def __init__(self, queryset, per_page, keys=KEYS):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.keys = keys
+
+    def _after(self, pub_date, pk, direction):
+        date_key, id_key = self.keys
+        return Q(**{f'{date_key}__{direction}': pub_date}) | Q(**{
+            date_key: pub_date, f'{id_key}__{direction}': pk})
+
+    def get_page(self, after=None, before=None):
+        """Вернёт страницу после курсора after или перед курсором before.
+
+        Испорченные токены игнорируются, как и в Paginator.get_page:
+        пользователь получает первую страницу вместо ошибки.
+        """
+
+        date_key, id_key = self.keys
+        after = decode_cursor(after)
+        before = decode_cursor(before) if after is None else None
+        if before is not None:
+            pub_date, pk = before
+            rows = list(
+                self.queryset.filter(
+                    self._after(pub_date, pk, 'gt')
+                ).order_by(date_key, id_key)[:self.per_page + 1]
+            )
+            if not rows:
+                # Курсор новее самого нового поста: например, ссылка
+                # "назад" устарела после удаления постов.
+                return self.get_page()
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return CursorPage(rows, self, True, has_previous,
+                              f'before:{pub_date.isoformat()}|{pk}')
+
+        queryset = self.queryset.order_by(f'-{date_key}', f'-{id_key}')
+        cache_key = 'first'
+        if after is not None:
+            pub_date, pk = after
+            queryset = queryset.filter(self._after(pub_date, pk, 'lt'))
+            cache_key = f'after:{pub_date.isoformat()}|{pk}'
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page], self, has_next,
+                          after is not None, cache_key)
+
+
+def paginate(request, queryset, view_name, keys=KEYS):
+    """Разбивает ленту на страницы в режиме, заданном в PAGINATOR_MODE.
+
+    view_name - имя url вида 'posts:index'; для имён, которых нет
+    в настройке, используется обычная нумерованная пагинация.
+    keys передаются в CursorPaginator.
+    """
+
+    mode = getattr(settings, 'PAGINATOR_MODE', {}).get(view_name, NUMBERED)
+    if mode == CURSOR:
+        paginator = CursorPaginator(queryset, settings.PAGINATOR, keys)
+        return paginator.get_page(request.GET.get('after'),
+                                  request.GET.get('before'))
+    paginator = Paginator(queryset, settings.PAGINATOR)
+    return paginator.get_page(request.GET.get('page'))
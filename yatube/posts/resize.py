@@ -0,0 +1,174 @@
+"""Уменьшение картинок постов по запросу: /media/resize/<w>x<h>/<path>.
+
+Ссылки подписываются (signing), поэтому посетитель не может заказать
+произвольный размер. Результат кладётся в дисковый кэш RESIZE_CACHE_DIR
+размером не больше RESIZE_CACHE_MAX_SIZE; при переполнении удаляются
+файлы, к которым дольше всего не обращались. Обход кэша дорог, поэтому
+размер проверяется после каждых RESIZE_EVICT_EVERY созданных процессом
+картинок, а не на каждом промахе. Одинаковые запросы из
+разных процессов ждут на файловой блокировке, и уменьшает картинку
+только один из них.
+"""
+import fcntl
+import itertools
+import os
+import tempfile
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils._os import safe_join
+from PIL import Image, ImageOps
+
+SALT = 'posts.resize'
+SOURCE_DIR = 'posts/'
+
+# Число картинок, созданных процессом.
+_writes = itertools.count(1)
+
+
+def _value(width, height, path):
+    return f'{width}x{height}/{path}'
+
+
+def resize_url(path, width, height):
+    """Подписанная ссылка на картинку path, уменьшенную до width x height."""
+
+    signature = signing.Signer(salt=SALT).signature(
+        _value(width, height, path))
+    url = reverse('posts:resize', args=(width, height, path))
+    return f'{url}?s={signature}'
+
+
+def check_signature(width, height, path, signature):
+    expected = signing.Signer(salt=SALT).signature(
+        _value(width, height, path))
+    return signing.constant_time_compare(expected, signature or '')
+
+
+def source_path(path):
+    """Путь к оригиналу внутри MEDIA_ROOT/posts/ или None."""
+
+    if not path.startswith(SOURCE_DIR):
+        return None
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except ValueError:
+        return None
+    return full_path if os.path.isfile(full_path) else None
+
+
+def cache_path(width, height, path):
+    return safe_join(settings.RESIZE_CACHE_DIR, f'{width}x{height}', path)
+
+
+def _resize(source, target, width, height):
+    with Image.open(source) as image:
+        format_ = image.format
+        image = ImageOps.exif_transpose(image)
+        if format_ == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    # Файл пишется рядом и переименовывается: читатели без блокировки
+    # никогда не увидят недописанную картинку.
+    descriptor, temp_path = tempfile.mkstemp(
+        prefix='.', dir=os.path.dirname(target))
+    try:
+        with os.fdopen(descriptor, 'wb') as temp:
+            image.save(temp, format_)
+        os.replace(temp_path, target)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _cache_files():
+    for root, _, files in os.walk(settings.RESIZE_CACHE_DIR):
+        for name in files:
+            if name.startswith('.') or name.endswith('.lock'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+
+def evict(max_size=None):
+    """Удаляет самые давно использованные файлы, пока кэш больше лимита.
+
+    Вернёт число удалённых файлов.
+    """
+
+    if max_size is None:
+        max_size = settings.RESIZE_CACHE_MAX_SIZE
+    entries = sorted(_cache_files())
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def get_resized(path, width, height):
+    """Вернёт путь к уменьшенной картинке, создав её при промахе.
+
+    Для отсутствующего оригинала вернёт None.
+    """
+
+    source = source_path(path)
+    if source is None:
+        return None
+    target = cache_path(width, height, path)
+    try:
+        # mtime служит меткой последнего обращения для вытеснения.
+        os.utime(target)
+        return target
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    lock_path = target + '.lock'
+    try:
+        with open(lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Пока ждали блокировку, картинку мог создать другой процесс.
+            if os.path.exists(target):
+                return target
+            _resize(source, target, width, height)
+    finally:
+        # Картинка уже на месте или не получилась: опоздавшие процессы
+        # найдут её без блокировки или попробуют сами.
+        try:
+            os.unlink(lock_path)
+        except FileNotFoundError:
+            pass
+    if next(_writes) % settings.RESIZE_EVICT_EVERY == 0:
+        evict()
+    return target
+
+
+def open_resized(path, width, height):
+    """Откроет уменьшенную картинку для ответа или вернёт None.
+
+    Между созданием и открытием файл может вытеснить другой процесс:
+    тогда картинка создаётся ещё раз. Открытый файл вытеснение уже не
+    помешает отдать.
+    """
+
+    for _ in range(2):
+        target = get_resized(path, width, height)
+        if target is None:
+            return None
+        try:
+            return open(target, 'rb')
+        except FileNotFoundError:
+            continue
+    return None
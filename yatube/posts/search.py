@@ -0,0 +1,203 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Тексты индексируются в таблицах SQLite FTS5 posts_post_fts и
+posts_comment_fts. Это таблицы с внешним содержимым: сами тексты
+хранятся только в posts_post и posts_comment, а индекс поддерживают
+триггеры из миграции 0012. Запрос ищет слова в постах и в комментариях
+к ним; пост, найденный несколько раз, получает лучшую оценку bm25 и
+фрагмент текста с подсвеченными словами.
+
+Страницы листаются курсором по (оценка, id), поэтому ни COUNT(*), ни
+OFFSET не нужны: каждая страница читает из индекса только совпадения.
+"""
+import base64
+import binascii
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .paginators import CursorPage
+
+# Управляющие символы не встречаются в тексте постов, поэтому ими можно
+# отметить найденные слова и подсветить их уже после экранирования HTML.
+MARK_START = '\x02'
+MARK_END = '\x03'
+SNIPPET_TOKENS = 24
+INDEXES = ('posts_post_fts', 'posts_comment_fts')
+
+WORD_RE = re.compile(r'\w+')
+
+# Сначала по оценкам bm25 выбирается страница (ranked), и только для
+# её постов второй проход по индексу строит фрагменты текста: snippet()
+# дорогая, а совпадений с частым словом может быть очень много.
+RANK_SQL = """
+WITH hits AS (
+    SELECT rowid AS post_id, bm25(posts_post_fts) AS score
+    FROM posts_post_fts
+    WHERE posts_post_fts MATCH %s
+    UNION ALL
+    SELECT comment.post_id, bm25(posts_comment_fts)
+    FROM posts_comment_fts
+    JOIN posts_comment AS comment ON comment.id = posts_comment_fts.rowid
+    WHERE posts_comment_fts MATCH %s AND comment.post_id IS NOT NULL
+), best AS (
+    SELECT post_id, MIN(score) AS score
+    FROM hits
+    GROUP BY post_id
+)
+SELECT post_id, score
+FROM best
+WHERE (score, post_id) > (%s, %s)
+ORDER BY score, post_id
+LIMIT %s
+"""
+
+SEARCH_SQL = f"""
+WITH ranked AS ({RANK_SQL}), snippets AS (
+    SELECT ranked.post_id,
+           bm25(posts_post_fts) AS score,
+           snippet(posts_post_fts, 0, '{MARK_START}', '{MARK_END}', '…',
+                   {SNIPPET_TOKENS}) AS snippet
+    FROM ranked
+    CROSS JOIN posts_post_fts ON posts_post_fts.rowid = ranked.post_id
+    WHERE posts_post_fts MATCH %s
+    UNION ALL
+    SELECT ranked.post_id,
+           bm25(posts_comment_fts),
+           snippet(posts_comment_fts, 0, '{MARK_START}', '{MARK_END}', '…',
+                   {SNIPPET_TOKENS})
+    FROM ranked
+    CROSS JOIN posts_comment AS comment ON comment.post_id = ranked.post_id
+    CROSS JOIN posts_comment_fts ON posts_comment_fts.rowid = comment.id
+    WHERE posts_comment_fts MATCH %s
+)
+SELECT ranked.post_id, ranked.score, MIN(snippets.score), snippets.snippet
+FROM ranked
+JOIN snippets ON snippets.post_id = ranked.post_id
+GROUP BY ranked.post_id
+ORDER BY ranked.score, ranked.post_id
+"""
+
+
+def match_expression(query):
+    """Переводит строку из поиска в запрос FTS5 или вернёт None.
+
+    Операторы FTS5 пользователю недоступны: каждое слово берётся
+    в кавычки, все слова должны найтись, последнее - как префикс.
+    """
+
+    words = WORD_RE.findall(query or '')
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и оборачивает найденные слова в <mark>."""
+
+    html = escape(snippet)
+    html = html.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+def encode_cursor(score, post_id):
+    raw = f'{score!r}|{post_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Раскодирует курсор поиска. Для испорченного токена вернёт None."""
+
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        score, post_id = raw.decode().split('|')
+        return float(score), int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class SearchPage(CursorPage):
+    """Страница результатов поиска; листается только вперёд."""
+
+    def __init__(self, object_list, paginator, next_cursor, has_previous):
+        super().__init__(object_list, paginator, next_cursor is not None,
+                         has_previous)
+        self._next_cursor = next_cursor
+
+    @property
+    def next_cursor(self):
+        return self._next_cursor
+
+    @property
+    def previous_cursor(self):
+        return None
+
+
+class SearchPaginator:
+    """Курсорный пагинатор результатов поиска по (оценка bm25, id)."""
+
+    is_cursor = True
+
+    def __init__(self, queryset, query, per_page):
+        self.queryset = queryset
+        self.match = match_expression(query)
+        self.per_page = int(per_page)
+
+    def get_page(self, after=None):
+        if self.match is None:
+            return SearchPage([], self, None, False)
+        cursor = decode_cursor(after)
+        score, post_id = cursor or (float('-inf'), 0)
+        with connection.cursor() as db:
+            db.execute(SEARCH_SQL, [self.match, self.match, score, post_id,
+                                    self.per_page + 1, self.match,
+                                    self.match])
+            hits = [(post_id, score, snippet)
+                    for post_id, score, _, snippet in db.fetchall()]
+        next_cursor = None
+        if len(hits) > self.per_page:
+            hits = hits[:self.per_page]
+            next_cursor = encode_cursor(hits[-1][1], hits[-1][0])
+        posts = self.queryset.in_bulk([hit[0] for hit in hits])
+        results = []
+        for post_id, score, snippet in hits:
+            # Пост мог быть удалён между двумя запросами.
+            post = posts.get(post_id)
+            if post is None:
+                continue
+            post.search_score = score
+            post.search_snippet = highlight(snippet)
+            results.append(post)
+        return SearchPage(results, self, next_cursor, cursor is not None)
+
+
+def filter_matching(queryset, query):
+    """Оставит в queryset постов или комментариев строки со словами query.
+
+    Для пустого запроса queryset возвращается без изменений.
+    """
+
+    match = match_expression(query)
+    if match is None:
+        return queryset
+    table = queryset.model._meta.db_table
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s',
+        (match,),
+    ))
+
+
+def maintain(command):
+    """Выполняет команду FTS5 ('rebuild', 'optimize') для всех индексов."""
+
+    with connection.cursor() as db:
+        for index in INDEXES:
+            db.execute(f"INSERT INTO {index}({index}) VALUES (%s)",
+                       [command])
@@ -0,0 +1,130 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.page_cache import purge
+
+from . import archive, counters, tags, timeline
+from .cache import bump_index_version
+from .models import Comment, Follow, Group, Post
+
+
+def purge_post_pages(post, tag_names=()):
+    """Сбрасывает закэшированные страницы, на которых виден пост."""
+
+    keys = ['index', f'post:{post.pk}', f'author:{post.author.username}']
+    if post.group_id is not None:
+        keys.append(f'group:{post.group.slug}')
+    keys.extend(f'tag:{name}' for name in tag_names)
+    purge(*keys)
+
+
+def purge_image_pages(name):
+    """Сбрасывает фрагменты главной и страницы постов с картинкой name."""
+
+    bump_index_version()
+    for database in archive.databases():
+        posts = Post.objects.using(database).filter(
+            image=name).select_related('author', 'group')
+        for post in posts:
+            purge_post_pages(post, tags.extract(post.text))
+
+
+def release_image(name):
+    """После коммита удаляет картинку, если на неё больше не ссылаются."""
+
+    if name:
+        storage = Post._meta.get_field('image').storage
+        transaction.on_commit(lambda: storage.release(name))
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, raw=False, **kwargs):
+    """Сбрасывает страницу старой группы и удаляет заменённую картинку."""
+
+    if instance.pk is None or raw:
+        return
+    old = Post.objects.filter(pk=instance.pk).values_list(
+        'group_id', 'group__slug', 'image').first()
+    if old is None:
+        return
+    old_group_id, old_slug, old_image = old
+    if old_group_id != instance.group_id and old_slug is not None:
+        purge(f'group:{old_slug}')
+    if old_image != instance.image.name:
+        release_image(old_image)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    """Раскладывает новый пост по лентам подписчиков и тегам."""
+
+    bump_index_version()
+    changed_tags = set() if raw else tags.sync(instance)
+    purge_post_pages(instance, tags.extract(instance.text) | changed_tags)
+    if created and not raw:
+        counters.post_added(instance)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_index_version()
+    purge_post_pages(instance, tags.extract(instance.text))
+    if archive.is_moving():
+        # Пост переехал в архив: он по-прежнему учитывается в счётчиках,
+        # а его картинка используется.
+        return
+    counters.post_removed(instance)
+    release_image(instance.image.name)
+
+
+def purge_comment_pages(comment):
+    keys = [f'post:{comment.post_id}']
+    if comment.author_id is not None:
+        keys.append(f'author:{comment.author.username}')
+    purge(*keys)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    bump_index_version()
+    purge_comment_pages(instance)
+    if created and not raw:
+        counters.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_index_version()
+    purge_comment_pages(instance)
+    if not archive.is_moving():
+        counters.comment_removed(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_index_version()
+    purge('index', f'group:{instance.slug}')
+
+
+def purge_follow_pages(follow):
+    purge(f'author:{follow.author.username}',
+          f'author:{follow.user.username}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    # Счётчики обновляются первыми: лента решает по числу подписчиков.
+    if created and not raw:
+        counters.follow_added(instance)
+        timeline.follow_added(instance)
+    purge_follow_pages(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.follow_removed(instance)
+    timeline.follow_removed(instance)
+    purge_follow_pages(instance)
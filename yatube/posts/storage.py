@@ -0,0 +1,114 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл сохраняется под SHA-256 своего содержимого: posts/ab/abcdef....jpg.
+Одинаковые загрузки получают одно имя, один файл на диске и, так как
+ключ sorl-thumbnail строится по имени, один набор миниатюр. Ссылками
+на файл считаются строки моделей, чьё файловое поле использует это
+хранилище; release() удаляет файл, только когда ссылок не осталось.
+Сохранение и удаление одного имени ждут на файловой блокировке: иначе
+одновременная загрузка той же картинки могла бы взять имя файла, который
+release() уже решил удалить.
+"""
+import fcntl
+import hashlib
+import os
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import FileField
+from django.utils.deconstruct import deconstructible
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    """SHA-256 содержимого файла; позиция чтения возвращается в начало."""
+
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который называет файлы по их содержимому."""
+
+    def content_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    @contextmanager
+    def _locked(self, name):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lock_path = path + '.lock'
+        try:
+            with open(lock_path, 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                yield
+        finally:
+            try:
+                os.unlink(lock_path)
+            except FileNotFoundError:
+                pass
+
+    def _save(self, name, content):
+        name = self.content_name(name, content_hash(content))
+        with self._locked(name):
+            if not self.exists(name):
+                super()._save(name, content)
+        return name
+
+    def references(self, name):
+        """Число строк в БД, которые ссылаются на файл name.
+
+        Учитываются и строки, перенесённые в архив (posts.archive).
+        """
+
+        # archive импортирует модели, которые импортируют этот модуль.
+        from .archive import ARCHIVED_MODELS
+
+        count = 0
+        for model in apps.get_models():
+            databases = [DEFAULT_DB_ALIAS]
+            if settings.ARCHIVE_DATABASE and model in ARCHIVED_MODELS:
+                databases.append(settings.ARCHIVE_DATABASE)
+            for field in model._meta.get_fields():
+                if (isinstance(field, FileField)
+                        and field.storage.__class__ is self.__class__):
+                    for database in databases:
+                        count += model._default_manager.using(
+                            database).filter(**{field.name: name}).count()
+        return count
+
+    def release(self, name):
+        """Удаляет файл и его миниатюры, если на него больше не ссылаются.
+
+        Вернёт True, если файл удалён.
+        """
+
+        if not name:
+            return False
+        try:
+            self.path(name)
+        except SuspiciousFileOperation:
+            # Старые строки могут ссылаться на файлы вне MEDIA_ROOT.
+            return False
+        with self._locked(name):
+            if self.references(name):
+                return False
+            delete(ImageFile(name, self))
+        return True
+
+
+post_image_storage = ContentAddressedStorage()
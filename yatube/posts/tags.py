@@ -0,0 +1,89 @@
+"""Хэштеги постов.
+
+При сохранении поста слова вида #котики из его текста раскладываются
+в Tag и PostTag. У PostTag есть индекс (tag, -pub_date), поэтому
+страница /tag/<name>/ читает посты тега по индексу, как group_posts,
+а не ищет подстроку в тексте всех постов.
+"""
+import re
+
+from django.db.models import F
+
+from .models import Post, PostTag, Tag
+from .paginators import ENTRY_KEYS
+
+BATCH_SIZE = 500
+MAX_LENGTH = Tag._meta.get_field('name').max_length
+
+TAG_RE = re.compile(r'(?<![\w#])#(\w+)')
+
+
+def extract(text):
+    """Хэштеги из текста: без #, в нижнем регистре, без повторов."""
+
+    return {
+        name.lower() for name in TAG_RE.findall(text or '')
+        if len(name) <= MAX_LENGTH
+    }
+
+
+def _get_tags(names):
+    Tag.objects.bulk_create([Tag(name=name) for name in names],
+                            ignore_conflicts=True)
+    return Tag.objects.filter(name__in=names)
+
+
+def sync(post):
+    """Приводит хэштеги поста в соответствие с его текстом.
+
+    Вернёт имена тегов, которые у поста появились или пропали.
+    """
+
+    names = extract(post.text)
+    current = dict(PostTag.objects.filter(post=post).values_list(
+        'tag__name', 'pk'))
+    removed = set(current) - names
+    added = names - set(current)
+    if removed:
+        PostTag.objects.filter(
+            pk__in=[current[name] for name in removed]).delete()
+    if added:
+        PostTag.objects.bulk_create([
+            PostTag(tag=tag, post_id=post.pk, pub_date=post.pub_date)
+            for tag in _get_tags(added)
+        ], ignore_conflicts=True)
+    return added | removed
+
+
+def backfill(posts):
+    """Раскладывает по тегам пачку постов, не удаляя старые связи.
+
+    Вернёт число найденных связей, включая уже существовавшие.
+    """
+
+    posts = [(post, extract(post.text)) for post in posts]
+    tags = {
+        tag.name: tag
+        for tag in _get_tags(set().union(*(names for _, names in posts)))
+    }
+    entries = [
+        PostTag(tag=tags[name], post_id=post.pk, pub_date=post.pub_date)
+        for post, names in posts
+        for name in names
+    ]
+    PostTag.objects.bulk_create(entries, batch_size=BATCH_SIZE,
+                                ignore_conflicts=True)
+    return len(entries)
+
+
+def tag_posts(tag):
+    """Посты тега от новых к старым по индексу (tag, -pub_date, -post).
+
+    Для курсорной пагинации передайте paginate() keys=ENTRY_KEYS.
+    """
+
+    date_key, id_key = ENTRY_KEYS
+    return Post.objects.filter(tag_entries__tag=tag).annotate(**{
+        date_key: F('tag_entries__pub_date'),
+        id_key: F('tag_entries__post_id'),
+    }).order_by(f'-{date_key}', f'-{id_key}')
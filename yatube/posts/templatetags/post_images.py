@@ -0,0 +1,79 @@
+from django import template
+from django.conf import settings
+
+from posts import resize, thumbnails
+
+register = template.Library()
+
+SIZES = '(max-width: 992px) 100vw, 960px'
+
+
+def _srcset(variants):
+    return ', '.join(f'{thumbnail.url} {width}w'
+                     for _, width, thumbnail in variants)
+
+
+def display_size(post, alias):
+    """Размер картинки на странице по геометрии и сохранённым размерам."""
+
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[alias]
+    width, height = (int(side) for side in geometry.split('x'))
+    if options.get('crop') or not post.image_width:
+        return width, height
+    ratio = min(width / post.image_width, height / post.image_height)
+    if not options.get('upscale'):
+        ratio = min(ratio, 1)
+    return (max(round(post.image_width * ratio), 1),
+            max(round(post.image_height * ratio), 1))
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post, alias='card', eager=False):
+    """Картинка поста: <picture> с вариантами по ширине и формату.
+
+    Пока основной миниатюры нет, выводится оригинал. Сам тег миниатюры
+    не создаёт, а только ставит недостающие в очередь. Размеры, цвет
+    и размытая заглушка берутся из полей поста, файл не открывается.
+    Картинка загружается лениво, кроме первой на странице (eager), если
+    не выключен POST_IMAGE_LAZY.
+    """
+
+    image = post.image
+    if not image:
+        return {}
+    width, height = display_size(post, alias)
+    lazy = settings.POST_IMAGE_LAZY
+    context = {
+        'url': image.url,
+        'width': width,
+        'height': height,
+        'color': post.image_color,
+        'placeholder': post.image_placeholder if lazy else '',
+        'eager': eager or not lazy,
+    }
+    thumbnail = thumbnails.get_cached(image, alias)
+    if thumbnail is None:
+        thumbnails.enqueue(image)
+        return context
+    variants = thumbnails.get_cached_variants(image, alias)
+    if len(variants) < len(thumbnails.variants(alias)):
+        thumbnails.enqueue(image)
+    context['url'] = thumbnail.url
+    context['srcset'] = _srcset([variant for variant in variants
+                                 if variant[0] is None])
+    context['sources'] = [
+        {'type': mime_type,
+         'srcset': _srcset([variant for variant in variants
+                            if variant[0] == format_])}
+        for format_, mime_type in thumbnails.MIME_TYPES.items()
+        if any(variant[0] == format_ for variant in variants)
+    ]
+    context['sizes'] = SIZES
+    return context
+
+
+@register.simple_tag
+def resized_url(image, width, height):
+    """Подписанная ссылка на картинку, уменьшенную до width x height."""
+
+    return resize.resize_url(image.name, width, height) if image else ''
@@ -0,0 +1,198 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import archive, counters
+from posts.models import AuthorStats, Comment, Group, Post
+
+User = get_user_model()
+
+ARCHIVE = 'archive'
+
+
+@override_settings(ARCHIVE_DATABASE=ARCHIVE, ARCHIVE_AFTER_DAYS=30,
+                   ARCHIVE_BATCH_SIZE=4)
+class ArchiveTest(TestCase):
+    databases = {'default', ARCHIVE}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for number in range(12):
+            post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text=f'Старый пост {number}')
+            Comment.objects.create(post=post, author=cls.reader,
+                                   text=f'Комментарий {number}')
+        Post.objects.update(pub_date=timezone.now() - timedelta(days=60))
+        for number in range(3):
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Новый пост {number}')
+        cls.old_post = Post.objects.get(text='Старый пост 0')
+        archive.archive_posts()
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_old_posts_moved(self):
+        """Старые посты и их комментарии переезжают в архив."""
+
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(Post.objects.using(ARCHIVE).count(), 12)
+        self.assertEqual(Comment.objects.using(ARCHIVE).count(), 12)
+        self.assertEqual(
+            Post.objects.using(ARCHIVE).get(pk=self.old_post.pk).pub_date,
+            self.old_post.pub_date)
+        self.assertTrue(User.objects.using(ARCHIVE).filter(
+            username='reader').exists())
+
+    def test_counters_keep_archived(self):
+        """Перенос в архив не уменьшает счётчики, пересчёт их видит."""
+
+        stats = AuthorStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 15)
+        AuthorStats.objects.all().delete()
+        counters.reconcile()
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).comments_count, 12)
+
+    def test_profile_and_group_continue_in_archive(self):
+        """Страницы автора и группы продолжаются архивными постами."""
+
+        for url in (reverse('posts:profile', args=(self.author.username,)),
+                    reverse('posts:group_list', args=(self.group.slug,))):
+            with self.subTest(url=url):
+                first = self.authorized_client.get(url).context['page_obj']
+                second = self.authorized_client.get(
+                    url + '?page=2').context['page_obj']
+                self.assertEqual(first.paginator.count, 15)
+                self.assertEqual(first[0].text, 'Новый пост 2')
+                self.assertEqual(first[3].text, 'Старый пост 11')
+                self.assertEqual([post.text for post in second], [
+                    f'Старый пост {number}' for number in range(4, -1, -1)])
+
+    def test_feed_counts_each_database_once(self):
+        """Страница ленты считает посты в каждой базе один раз."""
+
+        feed = archive.with_archive(Post.objects.order_by('-pub_date'))
+        paginator = Paginator(feed, 10)
+        # Свежих постов всего три: в основной базе только COUNT, в
+        # архиве COUNT и срез.
+        with self.assertNumQueries(1, using='default'), \
+                self.assertNumQueries(2, using=ARCHIVE):
+            page = paginator.page(2)
+            self.assertEqual(len(page), 5)
+
+    def test_cursor_pages_cross_archive(self):
+        """Курсорная пагинация переходит в архив и возвращается."""
+
+        url = reverse('posts:profile', args=(self.author.username,))
+        with override_settings(PAGINATOR_MODE={'posts:profile': 'cursor'}):
+            first = self.authorized_client.get(url).context['page_obj']
+            second = self.authorized_client.get(
+                f'{url}?after={first.next_cursor}').context['page_obj']
+            back = self.authorized_client.get(
+                f'{url}?before={second.previous_cursor}'
+            ).context['page_obj']
+        self.assertEqual([post.text for post in second], [
+            f'Старый пост {number}' for number in range(4, -1, -1)])
+        self.assertEqual([post.pk for post in back],
+                         [post.pk for post in first])
+
+    def test_post_detail_finds_archived(self):
+        """Архивный пост открывается, но комментировать его нельзя."""
+
+        url = reverse('posts:post_detail', args=(self.old_post.pk,))
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Комментарий 0')
+        self.assertContains(response, 'Запись в архиве')
+        self.assertNotContains(response, 'Добавить комментарий')
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', args=(self.old_post.pk,)),
+            {'text': 'Поздно'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_post(self):
+        """Поста нет ни в одной базе - 404."""
+
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=(10 ** 6,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_command(self):
+        """archive_posts переносит оставшиеся старые посты."""
+
+        Post.objects.filter(text='Новый пост 0').update(
+            pub_date=timezone.now() - timedelta(days=31))
+        out = StringIO()
+        call_command('archive_posts', stdout=out)
+        self.assertIn('постов: 1, комментариев: 0', out.getvalue())
+
+    @override_settings(ARCHIVE_DATABASE=None)
+    def test_command_without_archive(self):
+        """Без архивной базы команда сообщает об ошибке."""
+
+        with self.assertRaises(CommandError):
+            call_command('archive_posts')
+
+
+@override_settings(ARCHIVE_DATABASE=ARCHIVE, ARCHIVE_AFTER_DAYS=30)
+class ArchiveRaceTest(TransactionTestCase):
+    databases = {'default', ARCHIVE}
+
+    def test_comment_during_move_is_not_lost(self):
+        """Комментарий, написанный во время переноса, не пропадает."""
+
+        author = User.objects.create_user(username='auth')
+        post = Post.objects.create(author=author, text='Старый пост')
+        Post.objects.update(pub_date=timezone.now() - timedelta(days=60))
+        written = []
+        insert = archive._insert
+
+        def write_comment():
+            try:
+                written.append(Comment.objects.create(
+                    post_id=post.pk, author=author, text='Поздний'))
+            except DatabaseError:
+                pass
+            finally:
+                connections.close_all()
+
+        def insert_and_comment(model, objects, date_field):
+            insert(model, objects, date_field)
+            if model is Comment:
+                # Другой посетитель комментирует пост посреди переноса.
+                thread = threading.Thread(target=write_comment)
+                thread.start()
+                thread.join()
+
+        with mock.patch.object(archive, '_insert', insert_and_comment):
+            archive.archive_posts()
+        for comment in written:
+            self.assertTrue(
+                Comment.objects.filter(pk=comment.pk).exists()
+                or Comment.objects.using(ARCHIVE).filter(
+                    pk=comment.pk).exists())
@@ -0,0 +1,67 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='Jack')
+        cls.post = Post.objects.create(author=cls.user, text='Тест текст')
+        Comment.objects.create(author=cls.reader, post=cls.post,
+                               text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def test_signals_update_counters(self):
+        """Счётчики меняются при создании и удалении объектов."""
+
+        stats = AuthorStats.objects.get(user=self.user)
+        reader_stats = AuthorStats.objects.get(user=self.reader)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(reader_stats.comments_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+
+        Follow.objects.all().delete()
+        self.post.delete()
+        stats.refresh_from_db()
+        reader_stats.refresh_from_db()
+        self.assertEqual(stats.posts_count, 0)
+        self.assertEqual(stats.followers_count, 0)
+        self.assertEqual(reader_stats.comments_count, 0)
+        self.assertEqual(reader_stats.following_count, 0)
+
+    def test_reconcile_counters_repairs_drift(self):
+        """Команда reconcile_counters исправляет рассинхронизацию."""
+
+        AuthorStats.objects.filter(user=self.user).update(posts_count=42)
+        AuthorStats.objects.filter(user=self.reader).delete()
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.user).posts_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.reader).following_count, 1)
+
+    def test_profile_shows_counters(self):
+        """Профиль показывает счётчики без подсчёта по таблицам."""
+
+        response = Client().get(reverse('posts:profile',
+                                        args=(self.user.username,)))
+        self.assertEqual(response.context['count'], 1)
+        self.assertEqual(response.context['stats'].followers_count, 1)
+
+    def test_deleting_user_does_not_recreate_stats(self):
+        """Каскадное удаление пользователя не оставляет строк счётчиков."""
+
+        User.objects.get(pk=self.user.pk).delete()
+        self.assertFalse(AuthorStats.objects.filter(
+            user_id=self.user.pk).exists())
@@ -1,6 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from posts.forms import CommentForm, PostForm
@@ -9,6 +9,7 @@ from posts.models import Comment, Group, Post
 User = get_user_model()
 
 
+@override_settings(THUMBNAIL_BACKGROUND=False)
 class TaskCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -0,0 +1,94 @@
+import os
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import thumbnails
+from posts.models import Post
+from posts.storage import post_image_storage
+from posts.tests.utils import TempMediaMixin, make_image
+
+User = get_user_model()
+
+
+def write_file(name, content=b'orphan'):
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+
+
+class GarbageCollectMediaTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_gc_removes_only_orphans(self):
+        """Удаляются файлы без поста и миниатюры без записи в sorl."""
+
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   image=make_image('live.png', color='red'))
+        thumbnails.generate(post.image.name)
+        live_thumbnail = thumbnails.get_cached(post.image, 'card')
+        write_file('posts/ab/orphan.png')
+        write_file('cache/ab/cd/orphan.jpg', b'thumb')
+
+        out = StringIO()
+        call_command('gc_media', dry_run=True, min_age=0, stdout=out)
+        self.assertIn('Пробный запуск. Файлов: 2, освобождено байт: 11',
+                      out.getvalue())
+        self.assertTrue(post_image_storage.exists('posts/ab/orphan.png'))
+
+        out = StringIO()
+        call_command('gc_media', min_age=0, stdout=out)
+        self.assertIn('Файлов: 2, освобождено байт: 11', out.getvalue())
+        self.assertFalse(post_image_storage.exists('posts/ab/orphan.png'))
+        self.assertFalse(post_image_storage.exists('cache/ab/cd/orphan.jpg'))
+        self.assertTrue(post_image_storage.exists(post.image.name))
+        self.assertTrue(post_image_storage.exists(live_thumbnail.name))
+
+    def test_gc_skips_recent_files(self):
+        """Свежие файлы не трогаются: загрузка могла не закоммититься."""
+
+        write_file('posts/ab/uploading.png')
+        out = StringIO()
+        call_command('gc_media', stdout=out)
+        self.assertIn('Файлов: 0', out.getvalue())
+
+    def test_replaced_image_is_released(self):
+        """Заменённая картинка удаляется, если её больше никто не взял."""
+
+        callbacks = []
+
+        def commit():
+            while callbacks:
+                callbacks.pop(0)()
+
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   image=make_image('old.png', color='red'))
+        shared = Post.objects.create(
+            author=self.user, text='Копия',
+            image=make_image('copy.png', color='blue'))
+        old_name = post.image.name
+        with mock.patch('posts.signals.transaction.on_commit',
+                        callbacks.append):
+            post.image = make_image('new.png', color='green')
+            post.save()
+            commit()
+            self.assertFalse(post_image_storage.exists(old_name))
+
+            # Картинку второго поста взял и первый - она остаётся.
+            post.image = shared.image.name
+            post.save()
+            shared.delete()
+            commit()
+        self.assertTrue(post_image_storage.exists(post.image.name))
@@ -0,0 +1,119 @@
+import re
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.management.commands.benchmark_page_weight import (
+    ImageCollector,
+)
+from posts.models import Post
+from posts.tests.utils import TempMediaMixin, make_image
+
+User = get_user_model()
+
+
+class ImageMetadataTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_upload_fills_metadata(self):
+        """При загрузке в посте сохраняются размеры, формат и цвет."""
+
+        upload = make_image('red.png')
+        self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': upload,
+        })
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (40, 20))
+        self.assertEqual(post.image_format, 'PNG')
+        self.assertEqual(post.image_size, upload.size)
+        self.assertEqual(post.image_color, '#ff0000')
+
+    def test_feed_renders_size_and_color(self):
+        """Лента выводит размеры и подложку картинки из полей поста."""
+
+        post = Post(author=self.user, text='Пост',
+                    image=make_image('blue.png', color=(0, 0, 255)))
+        post.update_image_metadata()
+        post.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'background-color: #0000ff')
+
+    def test_only_first_card_loads_eagerly(self):
+        """В ленте первая картинка грузится сразу, остальные лениво."""
+
+        for index in range(3):
+            post = Post(author=self.user, text=f'Пост {index}',
+                        image=make_image(f'card{index}.png'))
+            post.update_image_metadata()
+            post.save()
+        self.assertTrue(post.image_placeholder.startswith(
+            'data:image/jpeg;base64,'))
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'loading="eager"', count=1)
+        self.assertContains(response, 'loading="lazy"', count=2)
+        self.assertContains(response, post.image_placeholder, count=2)
+        out = StringIO()
+        call_command('benchmark_page_weight', stdout=out)
+        self.assertIn('из них ленивых 2', out.getvalue())
+        self.assertIn('Экономия при открытии', out.getvalue())
+
+    def test_page_weight_compares_without_lazy_loading(self):
+        """Без ленивой загрузки считаются все картинки и нет заглушек."""
+
+        sizes = []
+        for index in range(3):
+            post = Post(author=self.user, text=f'Пост {index}',
+                        image=make_image(f'weight{index}.png'))
+            post.update_image_metadata()
+            post.save()
+            sizes.append(post.image.size)
+        with self.settings(POST_IMAGE_LAZY=False):
+            response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'loading="lazy"')
+        self.assertNotContains(response, post.image_placeholder)
+        out = StringIO()
+        call_command('benchmark_page_weight', stdout=out)
+        before, after = (int(size) for size in re.findall(
+            r'картинки (\d+) байт', out.getvalue()))
+        # Первая карточка грузится сразу, две ленивые ниже первого экрана.
+        self.assertEqual(before - after, sizes[0] + sizes[1])
+
+    def test_page_weight_counts_srcset_candidate(self):
+        """Из <picture> считается вариант, который выберет браузер."""
+
+        collector = ImageCollector(width=600)
+        collector.feed(
+            '<picture><source type="image/avif" '
+            'srcset="/a480.avif 480w, /a960.avif 960w">'
+            '<img src="/card.jpg" srcset="/c480.jpg 480w" loading="lazy">'
+            '</picture><img src="/logo.png">')
+        self.assertEqual(collector.images,
+                         [('/a960.avif', True), ('/logo.png', False)])
+
+    def test_backfill_command(self):
+        """Команда заполняет поля у старых постов."""
+
+        post = Post.objects.create(author=self.user, text='Старый пост',
+                                   image=make_image('old.png', (10, 30)))
+        self.assertIsNone(post.image_width)
+        out = StringIO()
+        call_command('backfill_image_metadata', stdout=out)
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (10, 30))
+        self.assertIn('Обновлено постов: 1, с ошибками: 0', out.getvalue())
@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts.management.commands.loadtest import WEIGHTS, percentile
+from posts.models import Group, Post, Tag
+
+User = get_user_model()
+
+
+class LoadTestCommandTest(TestCase):
+    def test_percentile(self):
+        """Перцентиль берётся по ближайшему рангу."""
+
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_report(self):
+        """Команда нагружает все страницы и сохраняет сводку в JSON."""
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'loadtest.json')
+            out = StringIO()
+            call_command(
+                'loadtest', '--in-place', '--threads', '1', '--users', '3',
+                '--groups', '2', '--posts', '20', '--comments', '20',
+                '--requests', '140', '--warmup', '0', '--output', output,
+                stdout=out,
+            )
+            with open(output, encoding='utf-8') as file:
+                report = json.load(file)
+        self.assertEqual(set(report['results']), {*WEIGHTS, 'total'})
+        total = report['results']['total']
+        self.assertEqual(total['requests'], 140)
+        self.assertEqual(total['errors'], 0)
+        self.assertLessEqual(total['p50_ms'], total['p99_ms'])
+        self.assertGreater(
+            report['results']['posts:index']['queries_per_request'], 0)
+        self.assertIn('posts:post_detail', out.getvalue())
+
+    def test_in_place_cleanup(self):
+        """Прогон в текущей базе не трогает чужие строки и удаляет свои."""
+
+        author = User.objects.create_user(username='load0')
+        group = Group.objects.create(title='Группа', slug='load-0')
+        post = Post.objects.create(author=author, group=group,
+                                   text='Чужой пост #тег1')
+        with tempfile.TemporaryDirectory() as directory:
+            call_command(
+                'loadtest', '--in-place', '--threads', '1', '--users', '2',
+                '--groups', '1', '--posts', '10', '--comments', '5',
+                '--requests', '20', '--warmup', '0',
+                '--output', os.path.join(directory, 'loadtest.json'),
+                stdout=StringIO(),
+            )
+        self.assertQuerysetEqual(User.objects.all(), [repr(author)])
+        self.assertQuerysetEqual(Group.objects.all(), [repr(group)])
+        self.assertQuerysetEqual(Post.objects.all(), [repr(post)])
+        self.assertEqual(list(Tag.objects.values_list('name', flat=True)),
+                         ['тег1'])
+
+    def test_unknown_page(self):
+        """Вес для неизвестной страницы - ошибка."""
+
+        with self.assertRaisesMessage(CommandError, 'posts:nope'):
+            call_command('loadtest', '--weight', 'posts:nope=1')
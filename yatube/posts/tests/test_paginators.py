@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Group, Post
+from posts.paginators import CursorPaginator, decode_cursor, encode_cursor
+
+User = get_user_model()
+
+CURSOR_MODE = {
+    'posts:index': 'cursor',
+    'posts:group_list': 'cursor',
+    'posts:profile': 'cursor',
+    'posts:follow_index': 'cursor',
+}
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f'Пост {number}')
+            for number in range(13)
+        )
+        # Часть постов получает одинаковую дату, чтобы проверить,
+        # что id разрешает равенство pub_date.
+        same_date = timezone.now() - timedelta(days=1)
+        Post.objects.filter(
+            pk__in=Post.objects.order_by('pk').values('pk')[:5]
+        ).update(pub_date=same_date)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cursor_round_trip(self):
+        """Токен курсора раскодируется в (pub_date, id) поста."""
+
+        post = Post.objects.first()
+        self.assertEqual(decode_cursor(encode_cursor(post)),
+                         (post.pub_date, post.pk))
+        self.assertIsNone(decode_cursor('испорченный'))
+        self.assertIsNone(decode_cursor(None))
+
+    def test_pages_cover_feed_without_gaps(self):
+        """Листание вперёд и назад выдаёт все посты ровно один раз."""
+
+        paginator = CursorPaginator(Post.objects.all(), 5)
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        seen = []
+        page = paginator.get_page()
+        self.assertFalse(page.has_previous())
+        while True:
+            seen.extend(page)
+            if not page.has_next():
+                break
+            page = paginator.get_page(after=page.next_cursor)
+        self.assertEqual(seen, expected)
+
+        page = paginator.get_page(before=page.previous_cursor)
+        self.assertEqual(list(page), expected[5:10])
+        self.assertTrue(page.has_next())
+        self.assertTrue(page.has_previous())
+
+    def test_before_newest_post(self):
+        """Курсор before новее всех постов открывает первую страницу."""
+
+        paginator = CursorPaginator(Post.objects.all(), 5)
+        future = Post(pub_date=timezone.now() + timedelta(days=1), pk=10**6)
+        page = paginator.get_page(before=encode_cursor(future))
+        self.assertEqual(list(page), list(paginator.get_page()))
+        self.assertFalse(page.has_previous())
+        self.assertIsNone(page.previous_cursor)
+        self.assertIsNotNone(page.next_cursor)
+        with override_settings(PAGINATOR_MODE=CURSOR_MODE):
+            response = self.guest_client.get(
+                reverse('posts:index') + f'?before={encode_cursor(future)}')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PAGINATOR_MODE=CURSOR_MODE)
+    def test_views_use_cursor_mode(self):
+        """В курсорном режиме ленты листаются через ?after=."""
+
+        urls = (reverse('posts:index'),
+                reverse('posts:group_list', args=(self.group.slug,)),
+                reverse('posts:profile', args=(self.user.username,)))
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), 10)
+                self.assertContains(response,
+                                    f'?after={page_obj.next_cursor}')
+                response = self.guest_client.get(
+                    url, {'after': page_obj.next_cursor})
+                self.assertEqual(len(response.context['page_obj']), 3)
+                self.assertFalse(response.context['page_obj'].has_next())
@@ -0,0 +1,122 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Шаг плана, который читает таблицу целиком, а не по индексу. Обход
+# индекса (SCAN ... USING INDEX) допустим: с LIMIT он читает только
+# одну страницу, а COUNT(*) по индексу дешевле чтения таблицы.
+TABLE_SCAN_RE = re.compile(r'^SCAN (TABLE )?(?!subquery)\w+$')
+
+VIEWS = ('posts:index', 'posts:group_list', 'posts:profile', 'posts:tag',
+         'posts:follow_index')
+
+
+def plan(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryPlanTest(TestCase):
+    """Запросы лент идут по индексам, без полного чтения и сортировки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        # Постов больше, чем на одной странице, чтобы проверить и
+        # запросы следующих страниц.
+        for number in range(settings.PAGINATOR + 2):
+            cls.post = Post.objects.create(author=cls.author,
+                                           group=cls.group,
+                                           text=f'Пост {number} #тег')
+        Comment.objects.create(post=cls.post, author=cls.reader,
+                               text='Комментарий')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def urls(self):
+        return {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse('posts:group_list',
+                                        args=(self.group.slug,)),
+            'posts:profile': reverse('posts:profile',
+                                     args=(self.author.username,)),
+            'posts:tag': reverse('posts:tag', args=('тег',)),
+            'posts:follow_index': reverse('posts:follow_index'),
+            'posts:post_detail': reverse('posts:post_detail',
+                                         args=(self.post.pk,)),
+        }
+
+    def assert_plans_use_indexes(self, url):
+        """Проверяет планы всех SELECT страницы и вернёт её контекст."""
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            # Запросы сохранены уже с подставленными параметрами.
+            for step in plan(query['sql'], ()):
+                with self.subTest(url=url, sql=query['sql'], step=step):
+                    self.assertNotIn('TEMP B-TREE', step)
+                    self.assertIsNone(TABLE_SCAN_RE.match(step))
+        return response.context
+
+    def test_numbered_feeds(self):
+        """Страницы с нумерованной пагинацией."""
+
+        for url in self.urls().values():
+            self.assert_plans_use_indexes(url)
+        self.assert_plans_use_indexes(reverse('posts:index') + '?page=2')
+
+    @override_settings(PAGINATOR_MODE=dict.fromkeys(VIEWS, 'cursor'))
+    def test_cursor_feeds(self):
+        """Первая, следующая и предыдущая страницы курсорных лент."""
+
+        for view_name, url in self.urls().items():
+            context = self.assert_plans_use_indexes(url)
+            if view_name not in VIEWS:
+                continue
+            page = context['page_obj']
+            self.assertTrue(page.has_next(), view_name)
+            page = self.assert_plans_use_indexes(
+                f'{url}?after={page.next_cursor}')['page_obj']
+            self.assert_plans_use_indexes(
+                f'{url}?before={page.previous_cursor}')
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_hybrid_follow_feed(self):
+        """Лента подписок с «гибридным» автором тоже идёт по индексам."""
+
+        url = reverse('posts:follow_index')
+        context = self.assert_plans_use_indexes(url)
+        self.assertEqual(len(context['page_obj']), settings.PAGINATOR)
+        self.assert_plans_use_indexes(f'{url}?page=2')
+        with override_settings(PAGINATOR_MODE=dict.fromkeys(VIEWS,
+                                                            'cursor')):
+            page = self.assert_plans_use_indexes(url)['page_obj']
+            page = self.assert_plans_use_indexes(
+                f'{url}?after={page.next_cursor}')['page_obj']
+            self.assertEqual(len(page), 2)
+            self.assert_plans_use_indexes(
+                f'{url}?before={page.previous_cursor}')
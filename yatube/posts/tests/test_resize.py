@@ -0,0 +1,141 @@
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts import resize
+
+MEDIA_ROOT = tempfile.mkdtemp()
+RESIZE_CACHE_DIR = os.path.join(MEDIA_ROOT, 'resize_cache')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESIZE_CACHE_DIR=RESIZE_CACHE_DIR)
+class ResizeTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(MEDIA_ROOT, 'posts'), exist_ok=True)
+        Image.new('RGB', (400, 300), (200, 0, 0)).save(
+            os.path.join(MEDIA_ROOT, 'posts', 'photo.jpg'))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(RESIZE_CACHE_DIR, ignore_errors=True)
+
+    def test_signed_url_returns_resized_image(self):
+        """По подписанной ссылке отдаётся картинка нужного размера."""
+
+        response = self.client.get(resize.resize_url('posts/photo.jpg',
+                                                     120, 80))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (120, 80))
+
+    def test_bad_requests_return_404(self):
+        """Без подписи, с чужой подписью и вне posts/ отдаётся 404."""
+
+        signed = resize.resize_url('posts/photo.jpg', 120, 80)
+        urls = (
+            signed.split('?')[0],
+            signed.replace('120x80', '121x80'),
+            resize.resize_url('posts/missing.jpg', 120, 80),
+            resize.resize_url('other/photo.jpg', 120, 80),
+            resize.resize_url('posts/photo.jpg', 5000, 80),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_hit_is_served_from_disk(self):
+        """Повторный запрос не уменьшает картинку заново."""
+
+        url = resize.resize_url('posts/photo.jpg', 120, 80)
+        self.client.get(url)
+        with mock.patch.object(resize, '_resize') as resize_mock:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        resize_mock.assert_not_called()
+
+    def test_concurrent_requests_are_coalesced(self):
+        """Одновременные запросы одного варианта уменьшают его один раз."""
+
+        original = resize._resize
+        calls = []
+
+        def slow_resize(*args):
+            calls.append(args)
+            time.sleep(0.2)
+            original(*args)
+
+        with mock.patch.object(resize, '_resize', slow_resize):
+            threads = [
+                threading.Thread(target=resize.get_resized,
+                                 args=('posts/photo.jpg', 120, 80))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+
+    def test_evict_removes_least_recently_used(self):
+        """При переполнении удаляются давно не запрошенные файлы."""
+
+        old = resize.get_resized('posts/photo.jpg', 120, 80)
+        new = resize.get_resized('posts/photo.jpg', 60, 40)
+        os.utime(old, (0, 0))
+        self.assertEqual(resize.evict(max_size=os.path.getsize(new)), 1)
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+
+    @override_settings(RESIZE_EVICT_EVERY=2)
+    def test_evict_runs_every_n_writes(self):
+        """Кэш проверяется на переполнение не на каждом промахе."""
+
+        with mock.patch.object(resize, '_writes', itertools.count(1)), \
+                mock.patch.object(resize, 'evict') as evict:
+            for width in (30, 40, 50, 60):
+                resize.get_resized('posts/photo.jpg', width, 20)
+        self.assertEqual(evict.call_count, 2)
+
+    def test_lock_is_removed_after_failure(self):
+        """Файл блокировки удаляется, даже если уменьшить не удалось."""
+
+        target = resize.cache_path(120, 80, 'posts/photo.jpg')
+        with mock.patch.object(resize, '_resize', side_effect=OSError), \
+                self.assertRaises(OSError):
+            resize.get_resized('posts/photo.jpg', 120, 80)
+        self.assertFalse(os.path.exists(target + '.lock'))
+
+    def test_evicted_before_open_is_recreated(self):
+        """Картинка, вытесненная до открытия, создаётся заново."""
+
+        get_resized = resize.get_resized
+        calls = []
+
+        def evicted(*args):
+            target = get_resized(*args)
+            if not calls:
+                os.unlink(target)
+            calls.append(target)
+            return target
+
+        with mock.patch.object(resize, 'get_resized', evicted):
+            response = self.client.get(
+                resize.resize_url('posts/photo.jpg', 120, 80))
+            self.assertEqual(response.status_code, 200)
+            response.close()
+        self.assertEqual(len(calls), 2)
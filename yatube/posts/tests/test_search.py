@@ -0,0 +1,132 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.cat_post = Post.objects.create(
+            author=cls.user, text='Кот <b>Барсик</b> спит на диване')
+        cls.dog_post = Post.objects.create(
+            author=cls.user, text='Собака гуляет во дворе')
+        Comment.objects.create(post=cls.dog_post, author=cls.user,
+                               text='А у соседей живёт кот')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Заметка про погоду {number}')
+            for number in range(5)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_match_expression(self):
+        """Операторы FTS5 в запросе экранируются."""
+
+        self.assertEqual(search.match_expression('кот OR "пёс'),
+                         '"кот" "OR" "пёс"*')
+        self.assertIsNone(search.match_expression(' -*" '))
+
+    def test_search_posts_and_comments(self):
+        """Поиск находит слова в постах и в комментариях к ним."""
+
+        response = self.guest_client.get(reverse('posts:search'),
+                                         {'q': 'КОТ'})
+        self.assertTemplateUsed(response, 'posts/search.html')
+        found = list(response.context['page_obj'])
+        self.assertCountEqual(found, [self.cat_post, self.dog_post])
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        """Фрагмент экранирует HTML поста и подсвечивает слово."""
+
+        response = self.guest_client.get(reverse('posts:search'),
+                                         {'q': 'барсик'})
+        post = response.context['page_obj'][0]
+        self.assertEqual(
+            post.search_snippet,
+            'Кот &lt;b&gt;<mark>Барсик</mark>&lt;/b&gt; спит на диване',
+        )
+        self.assertContains(response, '<mark>Барсик</mark>')
+
+    def test_index_follows_edits(self):
+        """Триггеры обновляют индекс при изменении и удалении текста."""
+
+        self.cat_post.text = 'Теперь здесь про попугая'
+        self.cat_post.save()
+        paginator = search.SearchPaginator(Post.objects.all(), 'кот', 10)
+        self.assertEqual(list(paginator.get_page()), [self.dog_post])
+        self.assertEqual(
+            list(search.SearchPaginator(Post.objects.all(), 'попуга',
+                                        10).get_page()),
+            [self.cat_post],
+        )
+        self.dog_post.comments.all().delete()
+        self.assertEqual(list(paginator.get_page()), [])
+
+    def test_cursor_pages_cover_results(self):
+        """Курсор выдаёт все результаты по порядку оценки ровно один раз."""
+
+        paginator = search.SearchPaginator(Post.objects.all(), 'погоду', 2)
+        seen = []
+        page = paginator.get_page()
+        self.assertFalse(page.has_previous())
+        while True:
+            seen.extend(page)
+            if not page.has_next():
+                break
+            page = paginator.get_page(after=page.next_cursor)
+            self.assertTrue(page.has_previous())
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+        scores = [(post.search_score, post.pk) for post in seen]
+        self.assertEqual(scores, sorted(scores))
+
+    def test_empty_query(self):
+        """Пустой запрос ничего не ищет."""
+
+        response = self.guest_client.get(reverse('posts:search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по индексу FTS5."""
+
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(reverse('admin:posts_post_changelist'),
+                              {'q': 'барсик'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.cat_post])
+        response = client.get(reverse('admin:posts_comment_changelist'),
+                              {'q': 'соседей'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_benchmark_command(self):
+        """benchmark_search замеряет ранжирование и весь запрос."""
+
+        out = StringIO()
+        call_command('benchmark_search', '--sizes', '20', '40',
+                     '--repeat', '1', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[1].split()[0], '20')
+
+    def test_rebuild_command(self):
+        """search_index --rebuild восстанавливает индекс по таблицам."""
+
+        search.maintain('delete-all')
+        paginator = search.SearchPaginator(Post.objects.all(), 'барсик', 10)
+        self.assertEqual(list(paginator.get_page()), [])
+        call_command('search_index', '--rebuild', stdout=StringIO())
+        self.assertEqual(list(paginator.get_page()), [self.cat_post])
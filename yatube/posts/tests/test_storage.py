@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from posts.storage import post_image_storage
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_BACKGROUND=False)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name, content):
+        return Post.objects.create(author=self.user, text='Пост',
+                                   image=ContentFile(content, name))
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые загрузки получают одно имя по содержимому."""
+
+        first = self.create_post('cat.JPG', b'same bytes')
+        second = self.create_post('cat.jpg', b'same bytes')
+        other = self.create_post('cat.jpg', b'other bytes')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertRegex(first.image.name,
+                         r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+
+    def test_release_keeps_referenced_files(self):
+        """Файл удаляется, только когда на него не ссылается ни один пост."""
+
+        first = self.create_post('cat.jpg', b'shared')
+        second = self.create_post('cat.jpg', b'shared')
+        name = first.image.name
+        first.delete()
+        self.assertFalse(post_image_storage.release(name))
+        self.assertTrue(post_image_storage.exists(name))
+        second.delete()
+        self.assertTrue(post_image_storage.release(name))
+        self.assertFalse(post_image_storage.exists(name))
+
+    def test_release_waits_for_concurrent_save(self):
+        """Загрузка той же картинки во время release() ждёт удаления и
+        записывает файл заново."""
+
+        post = self.create_post('cat.jpg', b'racing')
+        name = post.image.name
+        post.delete()
+        saved = []
+        upload = threading.Thread(target=lambda: saved.append(
+            post_image_storage.save('posts/cat.jpg',
+                                    ContentFile(b'racing'))))
+
+        def references(name):
+            upload.start()
+            time.sleep(0.1)
+            self.assertTrue(upload.is_alive())
+            return 0
+
+        with mock.patch.object(post_image_storage, 'references',
+                               references):
+            self.assertTrue(post_image_storage.release(name))
+        upload.join()
+        self.assertEqual(saved, [name])
+        self.assertTrue(post_image_storage.exists(name))
+
+    def test_references_use_index(self):
+        """Ссылки на файл ищутся по индексу, а не чтением всех постов."""
+
+        post = self.create_post('cat.jpg', b'indexed')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                post_image_storage.references(post.image.name), 1)
+        self.assertEqual(len(queries), 1)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + queries[0]['sql'])
+            steps = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(all('INDEX' in step for step in steps), steps)
+
+    def test_dedupe_command(self):
+        """Команда сводит старые копии к одному файлу по содержимому."""
+
+        os.makedirs(os.path.join(MEDIA_ROOT, 'posts'), exist_ok=True)
+        for name in ('posts/cat.jpg', 'posts/cat_HxiQWBK.jpg'):
+            with open(os.path.join(MEDIA_ROOT, name), 'wb') as file:
+                file.write(b'cat')
+            post = Post.objects.create(author=self.user, text='Пост')
+            Post.objects.filter(pk=post.pk).update(image=name)
+
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertTrue(post_image_storage.exists(names.pop()))
+        self.assertFalse(post_image_storage.exists('posts/cat.jpg'))
+        self.assertFalse(post_image_storage.exists('posts/cat_HxiQWBK.jpg'))
+        self.assertIn('Переименовано: 1, слито копий: 1', out.getvalue())
+
+    @override_settings(PAGE_CACHE_ENABLED=True)
+    def test_dedupe_command_purges_pages(self):
+        """Страницы со старым именем картинки сбрасываются из кэша."""
+
+        os.makedirs(os.path.join(MEDIA_ROOT, 'posts'), exist_ok=True)
+        with open(os.path.join(MEDIA_ROOT, 'posts/dog.jpg'), 'wb') as file:
+            file.write(b'dog')
+        post = Post.objects.create(author=self.user, text='Пост')
+        Post.objects.filter(pk=post.pk).update(image='posts/dog.jpg')
+        url = reverse('posts:post_detail', args=(post.pk,))
+        try:
+            self.assertContains(self.client.get(url), 'posts/dog.jpg')
+            call_command('dedupe_media', stdout=StringIO())
+            post.refresh_from_db()
+            self.assertContains(self.client.get(url), post.image.name)
+        finally:
+            cache.clear()
@@ -0,0 +1,99 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import tags
+from posts.models import Post, PostTag, Tag
+
+User = get_user_model()
+
+
+class TagsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Гуляем в парке #Осень #прогулка')
+        cls.other = Post.objects.create(
+            author=cls.user, text='#осень и листья, а не a#b и не ##x')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_extract(self):
+        """Хэштеги приводятся к нижнему регистру, # внутри слова - нет."""
+
+        self.assertEqual(tags.extract('#Осень, #осень! e-mail#x ##y #_1'),
+                         {'осень', '_1'})
+
+    def test_tags_follow_post_text(self):
+        """Теги поста обновляются при изменении текста."""
+
+        self.assertEqual(
+            set(self.post.tag_entries.values_list('tag__name', flat=True)),
+            {'осень', 'прогулка'},
+        )
+        self.post.text = 'Уже #зима'
+        self.post.save()
+        self.assertEqual(
+            list(self.post.tag_entries.values_list('tag__name', flat=True)),
+            ['зима'],
+        )
+        entry = self.post.tag_entries.get()
+        self.assertEqual(entry.pub_date, self.post.pub_date)
+
+    def test_tag_page(self):
+        """Страница тега показывает его посты от новых к старым."""
+
+        response = self.guest_client.get(reverse('posts:tag',
+                                                 args=('осень',)))
+        self.assertTemplateUsed(response, 'posts/tag.html')
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.other, self.post])
+        response = self.guest_client.get(reverse('posts:tag',
+                                                 args=('Осень',)))
+        self.assertRedirects(response, reverse('posts:tag',
+                                               args=('осень',)))
+        response = self.guest_client.get(reverse('posts:tag',
+                                                 args=('нет',)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_tag_page_cache_purged(self):
+        """Новый пост с тегом сбрасывает закэшированную страницу тега."""
+
+        url = reverse('posts:tag', args=('прогулка',))
+        with self.settings(PAGE_CACHE_ENABLED=True):
+            self.guest_client.get(url)
+            Post.objects.create(author=self.user, text='Снова #прогулка')
+            response = self.guest_client.get(url)
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_tag_page_uses_index(self):
+        """Посты тега читаются по индексу (tag, -pub_date)."""
+
+        tag = Tag.objects.get(name='осень')
+        sql, params = tags.tag_posts(tag).for_feed().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('post_tag_tag_pub_date', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_backfill_command(self):
+        """backfill_tags восстанавливает связи постов с тегами."""
+
+        PostTag.objects.all().delete()
+        out = StringIO()
+        call_command('backfill_tags', '--batch-size', '1', stdout=out)
+        self.assertIn('связей с тегами: 3', out.getvalue())
+        self.assertEqual(Tag.objects.get(name='осень').entries.count(), 2)
@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_BACKGROUND=False)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('thumb.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_page_shows_original_until_thumbnail_is_ready(self):
+        """Без миниатюры страница отдаёт оригинал и ставит её в очередь."""
+
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue, \
+                mock.patch.object(thumbnails.default.engine,
+                                  'get_image') as get_image:
+            response = self.client.get(
+                reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertContains(response, self.post.image.url)
+        enqueue.assert_called_once_with(self.post.image)
+        get_image.assert_not_called()
+
+    def test_page_shows_generated_thumbnail(self):
+        """После генерации страница отдаёт готовую миниатюру."""
+
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.get_cached(self.post.image, 'card')
+        self.assertEqual(list(thumbnail.size), [960, 339])
+        with mock.patch.object(thumbnails.default.engine,
+                               'get_image') as get_image:
+            response = self.client.get(
+                reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertContains(response, thumbnail.url)
+        get_image.assert_not_called()
+
+    def test_page_shows_srcset_variants(self):
+        """После генерации картинка выводится в <picture> со srcset."""
+
+        thumbnails.generate(self.post.image.name)
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertContains(response, '<picture>')
+        variants = thumbnails.get_cached_variants(self.post.image, 'card')
+        self.assertEqual(len(variants), len(thumbnails.variants('card')))
+        for format_, width, thumbnail in variants:
+            with self.subTest(format=format_, width=width):
+                self.assertContains(response, f'{thumbnail.url} {width}w')
+
+    @override_settings(PAGE_CACHE_ENABLED=True)
+    def test_cached_pages_are_purged(self):
+        """Готовые миниатюры сбрасывают страницы, закэшированные с
+        оригиналом."""
+
+        urls = (reverse('posts:index'),
+                reverse('posts:post_detail', args=(self.post.pk,)),
+                reverse('posts:profile', args=(self.user.username,)))
+        clients = {'anonymous': self.client,
+                   'authorized': self.authorized_client}
+        with mock.patch.object(thumbnails, 'enqueue'):
+            for client in clients.values():
+                for url in urls:
+                    client.get(url)
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.get_cached(self.post.image, 'card')
+        for name, client in clients.items():
+            for url in urls:
+                with self.subTest(url=url, client=name):
+                    self.assertContains(client.get(url), thumbnail.url)
+
+    @override_settings(THUMBNAIL_SRCSET_FORMATS=('WEBP', 'NO-SUCH-FORMAT'))
+    def test_unsupported_formats_are_skipped(self):
+        """Форматы, которые Pillow не умеет писать, пропускаются."""
+
+        self.assertNotIn('NO-SUCH-FORMAT', thumbnails.srcset_formats())
+
+    def test_upload_enqueues_thumbnails(self):
+        """Создание поста с картинкой ставит её в очередь."""
+
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            self.authorized_client.post(reverse('posts:post_create'), {
+                'text': 'Новый пост',
+                'image': SimpleUploadedFile('new.gif', SMALL_GIF,
+                                            'image/gif'),
+            })
+        post = Post.objects.latest('pk')
+        enqueue.assert_called_once_with(post.image)
+
+    def test_regenerate_command_resumes_from_checkpoint(self):
+        """Команда пропускает посты до контрольной точки."""
+
+        # Другой цвет в палитре: одинаковые картинки делят миниатюры.
+        other_gif = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\xFF\x00\xFF')
+        second = Post.objects.create(
+            author=self.user,
+            text='Второй пост',
+            image=SimpleUploadedFile('second.gif', other_gif, 'image/gif'),
+        )
+        checkpoint = os.path.join(MEDIA_ROOT, 'checkpoint')
+        with open(checkpoint, 'w') as file:
+            file.write(str(self.post.pk))
+        out = StringIO()
+        call_command('regenerate_thumbnails', processes=0,
+                     checkpoint=checkpoint, stdout=out)
+        self.assertIn('Готово: 1, с ошибками: 0', out.getvalue())
+        self.assertIsNone(thumbnails.get_cached(self.post.image, 'card'))
+        self.assertIsNotNone(thumbnails.get_cached(second.image, 'card'))
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_failure_is_not_retried(self):
+        """Картинка, которая не обработалась, не ставится в очередь снова."""
+
+        # В TestCase транзакция теста не коммитится: очередь запускается
+        # сразу.
+        with mock.patch.object(thumbnails.transaction, 'on_commit',
+                               lambda func: func()), \
+                mock.patch.object(thumbnails.default.engine, 'get_image',
+                                  side_effect=OSError) as get_image, \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            for _ in range(2):
+                self.authorized_client.get(
+                    reverse('posts:post_detail', args=(self.post.pk,)))
+        get_image.assert_called_once()
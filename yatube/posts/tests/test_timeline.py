@@ -0,0 +1,69 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry
+from posts.timeline import timeline_posts
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='Jack')
+        cls.old_post = Post.objects.create(author=cls.author,
+                                           text='Старый пост')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Подписка добавляет старые посты автора, отписка убирает их."""
+
+        self.authorized_client.get(reverse('posts:profile_follow',
+                                           args=(self.author.username,)))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.old_post).exists())
+
+        self.authorized_client.get(reverse('posts:profile_unfollow',
+                                           args=(self.author.username,)))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user).exists())
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост попадает в ленту подписчика."""
+
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_hybrid_author_is_merged_on_read(self):
+        """Посты популярного автора не раскладываются, но видны в ленте."""
+
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(list(timeline_posts(self.user)),
+                         [post, self.old_post])
+
+    def test_rebuild_command(self):
+        """Команда rebuild_timeline восстанавливает ленту."""
+
+        Follow.objects.create(user=self.user, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timeline', self.user.username,
+                     stdout=StringIO())
+        self.assertEqual(list(timeline_posts(self.user)), [self.old_post])
@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+from posts.tests.utils import TempMediaMixin, make_image
+
+User = get_user_model()
+
+
+class StreamingUploadTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def create_post(self, image):
+        return self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': image,
+        })
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_oversize_image_is_downscaled(self):
+        """Картинка больше лимита по стороне уменьшается до сохранения."""
+
+        self.create_post(make_image('image.jpg', (400, 40), format_='JPEG'))
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (100, 10))
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (100, 10))
+
+    def test_limits_are_reported_in_form(self):
+        """Нарушение лимитов показывается у поля картинки."""
+
+        cases = (
+            ({'POST_IMAGE_MAX_UPLOAD_SIZE': 100}, make_image(size=(400, 400)),
+             'Файл больше'),
+            ({'POST_IMAGE_MAX_PIXELS': 1000}, make_image(size=(100, 100)),
+             'мегапикселей'),
+            ({}, SimpleUploadedFile('image.png', b'not an image'),
+             'Загрузите картинку'),
+        )
+        for limits, image, error in cases:
+            with self.subTest(error=error), override_settings(**limits):
+                response = self.create_post(image)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(error,
+                              response.context['form'].errors['image'][0])
+        self.assertFalse(Post.objects.exists())
+
+    def test_csrf_is_still_checked(self):
+        """Проверка CSRF сохраняется после замены обработчиков загрузки."""
+
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('posts:post_create'),
+                               {'text': 'Пост'})
+        self.assertEqual(response.status_code, 403)
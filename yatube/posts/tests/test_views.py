@@ -3,7 +3,9 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from posts.models import Comment, Follow, Group, Post
@@ -11,6 +13,8 @@ from posts.models import Comment, Follow, Group, Post
 User = get_user_model()
 
 
+# Тестам нужен контекст шаблона, а его нет у ответа из кэша страниц.
+@override_settings(PAGE_CACHE_ENABLED=False, THUMBNAIL_BACKGROUND=False)
 class PostsViewTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -302,6 +306,8 @@ class PostsViewTest(TestCase):
                          follow_index.content.decode())
 
 
+# Тестам нужен контекст шаблона, а его нет у ответа из кэша страниц.
+@override_settings(PAGE_CACHE_ENABLED=False)
 class PaginatorViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -355,6 +361,22 @@ class PaginatorViewsTest(TestCase):
                 response = self.guest_client.get(adress)
                 self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cache_is_per_page(self):
+        """Фрагмент главной страницы кэшируется для каждой страницы."""
+
+        cache.clear()
+        self.guest_client.get(reverse('posts:index'))
+        response = self.guest_client.get(reverse('posts:index') + '?page=2')
+        self.assertContains(response, 'Дата публикации', count=3)
+
+    def test_cache_invalidated_by_new_post(self):
+        """Новый пост сразу появляется в закэшированной ленте."""
+
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.create(author=self.user, text='Свежий пост')
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
+
     def test_cache(self):
         """Тест проверяет работу кэша."""
 
@@ -367,3 +389,61 @@ class PaginatorViewsTest(TestCase):
         response = self.guest_client.get(reverse('posts:index'))
         self.assertNotContains(response, self.post.text)
         self.assertNotContains(response, self.group)
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='Jack')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.post = Post.objects.create(author=cls.user, text='Тест',
+                                       group=cls.group)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не растёт вместе с числом постов."""
+
+        urls = (reverse('posts:index'),
+                reverse('posts:group_list', args=(self.group.slug,)),
+                reverse('posts:profile', args=(self.user.username,)),
+                reverse('posts:follow_index'))
+        before = {url: self.count_queries(url) for url in urls}
+        for number in range(5):
+            post = Post.objects.create(author=self.user, group=self.group,
+                                       text=f'Пост {number}')
+            Comment.objects.create(author=self.reader, post=post,
+                                   text='Комментарий')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), before[url])
+
+    def test_post_detail_comments_in_constant_queries(self):
+        """Комментарии и их авторы на странице поста не дают N+1."""
+
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        before = self.count_queries(url)
+        for number in range(5):
+            author = User.objects.create_user(username=f'user{number}')
+            Comment.objects.create(author=author, post=self.post,
+                                   text='Комментарий')
+        self.assertEqual(self.count_queries(url), before)
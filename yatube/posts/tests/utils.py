@@ -0,0 +1,46 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import override_settings
+from PIL import Image
+
+
+def make_image(name='image.png', size=(40, 20), color=(255, 0, 0),
+               format_='PNG'):
+    """Картинка для загрузки в пост."""
+
+    file = BytesIO()
+    Image.new('RGB', size, color).save(file, format_)
+    return SimpleUploadedFile(name, file.getvalue(),
+                              f'image/{format_.lower()}')
+
+
+class TempMediaMixin:
+    """Картинки тестов пишутся во временный MEDIA_ROOT, который удаляется
+    после класса. Миниатюры создаются синхронно."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media_settings = override_settings(
+            MEDIA_ROOT=cls.media_root, THUMBNAIL_BACKGROUND=False)
+        cls._media_settings.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._remove_media()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls._remove_media()
+
+    @classmethod
+    def _remove_media(cls):
+        cls._media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
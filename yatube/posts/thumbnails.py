@@ -0,0 +1,278 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+Шаблоны не вызывают sorl-thumbnail напрямую: тег post_image только
+ищет готовую миниатюру в key-value хранилище sorl и, если её нет,
+показывает оригинал и ставит генерацию в очередь. Миниатюры всех
+размеров из THUMBNAIL_GEOMETRIES создаются в пуле потоков процесса
+после коммита транзакции, в которой сохранён пост. Без
+THUMBNAIL_BACKGROUND (в тестах) они создаются сразу после коммита в том
+же потоке. Неудача запоминается в кэше на THUMBNAIL_FAILURE_TIMEOUT,
+чтобы битая картинка не обрабатывалась заново на каждом запросе.
+
+Страницы, собранные до появления миниатюр, показывают оригинал. Когда
+миниатюры записаны, фрагменты главной и закэшированные страницы постов
+с этой картинкой сбрасываются, как при изменении поста.
+
+Кроме основной миниатюры для каждого размера создаются варианты
+шириной THUMBNAIL_SRCSET_WIDTHS в исходном формате и в форматах
+THUMBNAIL_SRCSET_FORMATS, которые умеет записывать установленный Pillow.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile
+
+from core import query_budget
+from .signals import purge_image_pages
+from .storage import post_image_storage
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+_pending = {}
+
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+}
+
+
+class CachedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет найти миниатюру, не создавая её."""
+
+    def get_options(self, source, options):
+        # Опции дополняются так же, как в ThumbnailBackend.get_thumbnail,
+        # иначе имя файла миниатюры не совпадёт.
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        # То же, что в sorl, но с расширением для AVIF.
+        key = tokey(source.key, geometry_string, serialize(options))
+        extension = EXTENSIONS.get(options['format'],
+                                   options['format'].lower())
+        return (f'{sorl_settings.THUMBNAIL_PREFIX}'
+                f'{key[:2]}/{key[2:4]}/{key}.{extension}')
+
+    def get_thumbnail_file(self, source, geometry_string, options):
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_cached(self, file_, geometry_string, **options):
+        source = _source(file_)
+        options = self.get_options(source, options)
+        return default.kvstore.get(
+            self.get_thumbnail_file(source, geometry_string, options))
+
+
+backend = CachedThumbnailBackend()
+
+
+def _source(file_):
+    # Ключ sorl зависит от хранилища, поэтому имя файла всегда
+    # открывается в хранилище картинок постов.
+    if isinstance(file_, str):
+        return ImageFile(file_, post_image_storage)
+    return ImageFile(file_)
+
+
+def get_cached(image, alias):
+    """Вернёт готовую миниатюру размера alias или None."""
+
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[alias]
+    return backend.get_cached(image, geometry, **options)
+
+
+def srcset_formats():
+    """Форматы из THUMBNAIL_SRCSET_FORMATS, которые умеет писать Pillow."""
+
+    Image.init()
+    return [format_ for format_ in settings.THUMBNAIL_SRCSET_FORMATS
+            if format_ in Image.SAVE]
+
+
+def variants(alias):
+    """Варианты миниатюры alias для srcset.
+
+    Вернёт список (формат, ширина, геометрия, опции); формат None
+    означает формат основной миниатюры.
+    """
+
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[alias]
+    base_width, base_height = (int(side) for side in geometry.split('x'))
+    result = []
+    for format_ in [None] + srcset_formats():
+        for width in settings.THUMBNAIL_SRCSET_WIDTHS:
+            height = round(base_height * width / base_width)
+            variant_options = dict(options)
+            if format_ is not None:
+                variant_options['format'] = format_
+            result.append((format_, width, f'{width}x{height}',
+                           variant_options))
+    return result
+
+
+def get_cached_variants(image, alias):
+    """Вернёт готовые варианты: список (формат, ширина, миниатюра)."""
+
+    result = []
+    for format_, width, geometry, options in variants(alias):
+        thumbnail = backend.get_cached(image, geometry, **options)
+        if thumbnail is not None:
+            result.append((format_, width, thumbnail))
+    return result
+
+
+def _geometries():
+    for alias, (geometry, options) in settings.THUMBNAIL_GEOMETRIES.items():
+        yield geometry, options
+        for _, _, variant_geometry, variant_options in variants(alias):
+            yield variant_geometry, variant_options
+
+
+def generate(name):
+    """Создаёт миниатюры всех размеров для картинки name."""
+
+    store(name, *render(name))
+
+
+def render(name, force=False):
+    """Создаёт файлы миниатюр, не записывая их в key-value хранилище.
+
+    Вернёт размер оригинала и список пар (имя, размер) созданных
+    миниатюр; результат передаётся в store(). Миниатюры, которые уже
+    есть в хранилище, пропускаются, если не задан force.
+    """
+
+    source = _source(name)
+    source_image = None
+    size = None
+    rendered = []
+    seen = set()
+    try:
+        for geometry, options in _geometries():
+            options = backend.get_options(source, options)
+            thumbnail = backend.get_thumbnail_file(source, geometry, options)
+            if thumbnail.name in seen:
+                continue
+            seen.add(thumbnail.name)
+            if not force and default.kvstore.get(thumbnail):
+                continue
+            if thumbnail.exists():
+                # Хранилище не перезаписывает файлы, а сохраняет новый
+                # под другим именем, которое потом не найдётся по ключу.
+                if not force:
+                    thumbnail.set_size()
+                    rendered.append((thumbnail.name, thumbnail.size))
+                    continue
+                thumbnail.delete()
+            if source_image is None:
+                source_image = default.engine.get_image(source)
+                size = default.engine.get_image_size(source_image)
+                image_info = default.engine.get_image_info(source_image)
+            options['image_info'] = image_info
+            backend._create_thumbnail(source_image, geometry, options,
+                                      thumbnail)
+            backend._create_alternative_resolutions(
+                source_image, geometry, options, thumbnail.name)
+            rendered.append((thumbnail.name, thumbnail.size))
+    finally:
+        if source_image is not None:
+            default.engine.cleanup(source_image)
+    return size, rendered
+
+
+def store(name, size, rendered):
+    """Записывает результат render() в key-value хранилище sorl."""
+
+    if not rendered:
+        return
+    source = _source(name)
+    source.set_size(size)
+    default.kvstore.set(source)
+    for thumbnail_name, thumbnail_size in rendered:
+        thumbnail = ImageFile(thumbnail_name, default.storage)
+        thumbnail.set_size(thumbnail_size)
+        default.kvstore.set(thumbnail, source)
+    purge_image_pages(name)
+
+
+def _failure_key(name):
+    return f'thumbnails:failed:{name}'
+
+
+def _generate(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+        cache.set(_failure_key(name), True,
+                  settings.THUMBNAIL_FAILURE_TIMEOUT)
+
+
+def _run(name):
+    try:
+        _generate(name)
+    finally:
+        with _lock:
+            _pending.pop(name, None)
+        # Поток пула живёт долго, соединение с БД нужно отпустить.
+        close_old_connections()
+
+
+def _submit(name):
+    global _executor
+    if cache.get(_failure_key(name)):
+        return
+    if not settings.THUMBNAIL_BACKGROUND:
+        with query_budget.exempt():
+            _generate(name)
+        return
+    with _lock:
+        if name in _pending:
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        _pending[name] = _executor.submit(_run, name)
+
+
+def enqueue(image):
+    """Ставит картинку в очередь после коммита текущей транзакции.
+
+    Картинка, которая уже стоит в очереди или недавно не обработалась,
+    повторно не добавляется.
+    """
+
+    if image:
+        name = image.name
+        transaction.on_commit(lambda: _submit(name))
+
+
+def wait(timeout=None):
+    """Ждёт, пока пул обработает все поставленные в очередь картинки."""
+
+    with _lock:
+        futures = list(_pending.values())
+    wait_futures(futures, timeout=timeout)
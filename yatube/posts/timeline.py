@@ -0,0 +1,198 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается в ленты подписчиков автора, поэтому
+follow_index читает готовый список вместо соединения Follow и Post.
+Посты авторов с огромным числом подписчиков не раскладываются:
+они подмешиваются в ленту при чтении (гибридная схема).
+"""
+from django.conf import settings
+from django.db.models import F
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .paginators import ENTRY_KEYS
+
+BATCH_SIZE = 500
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE,
+                                      ignore_conflicts=True)
+
+
+def followers_count(author_id):
+    count = AuthorStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first()
+    return count or 0
+
+
+def is_hybrid_author(author_id):
+    """Посты автора подмешиваются при чтении, а не раскладываются."""
+
+    return followers_count(author_id) > settings.TIMELINE_FANOUT_LIMIT
+
+
+def hybrid_authors(user):
+    """Авторы из подписок пользователя, чьи посты читаются напрямую."""
+
+    return Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values('author_id')
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+
+    if is_hybrid_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _bulk_insert([
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    ])
+
+
+def backfill(user_ids, author_id):
+    """Добавляет в ленты пользователей все посты автора."""
+
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date')
+    _bulk_insert([
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+        for user_id in user_ids
+    ])
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты пользователя посты автора."""
+
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+
+
+def follow_added(follow):
+    if not is_hybrid_author(follow.author_id):
+        backfill([follow.user_id], follow.author_id)
+
+
+def follow_removed(follow):
+    trim(follow.user_id, follow.author_id)
+    # Автор только что перестал быть «гибридным»: его посты, созданные
+    # без раскладки, нужно положить в ленты оставшихся подписчиков.
+    if followers_count(follow.author_id) == settings.TIMELINE_FANOUT_LIMIT:
+        followers = Follow.objects.filter(
+            author_id=follow.author_id).values_list('user_id', flat=True)
+        backfill(list(followers), follow.author_id)
+
+
+def rebuild(user):
+    """Пересобирает ленту пользователя по его подпискам."""
+
+    TimelineEntry.objects.filter(user=user).delete()
+    authors = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True)
+    for author_id in authors:
+        if not is_hybrid_author(author_id):
+            backfill([user.pk], author_id)
+
+
+class HybridTimeline:
+    """Лента подписок с «гибридными» авторами.
+
+    Лента складывается из потоков: записей ленты пользователя и постов
+    каждого гибридного автора. Каждый поток читается по своему индексу
+    уже в порядке ленты, а UNION ALL сливает их слиянием (MERGE) без
+    сортировки; потоки не пересекаются. Срез выбирает ключи страницы,
+    потом сами посты читаются по первичному ключу. Поддерживает то, что
+    нужно Paginator и CursorPaginator: count(), filter(), order_by() и
+    срезы.
+    """
+
+    ordered = True
+
+    def __init__(self, streams, posts=None, ordering=None):
+        date_key, id_key = ENTRY_KEYS
+        self.streams = streams
+        self.posts = Post.objects.all() if posts is None else posts
+        self.ordering = ordering or (f'-{date_key}', f'-{id_key}')
+
+    def _clone(self, **kwargs):
+        options = {'streams': self.streams, 'posts': self.posts,
+                   'ordering': self.ordering, **kwargs}
+        return HybridTimeline(**options)
+
+    def _keys(self):
+        first, *rest = [
+            stream.order_by().values_list(*ENTRY_KEYS)
+            for stream in self.streams
+        ]
+        return first.union(*rest, all=True)
+
+    def count(self):
+        return self._keys().count()
+
+    def filter(self, *args, **kwargs):
+        return self._clone(streams=[stream.filter(*args, **kwargs)
+                                    for stream in self.streams])
+
+    def order_by(self, *fields):
+        return self._clone(ordering=fields)
+
+    def for_feed(self):
+        return self._clone(posts=self.posts.for_feed())
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError('HybridTimeline поддерживает только срезы.')
+        keys = list(self._keys().order_by(*self.ordering)[index])
+        posts = self.posts.in_bulk([post_id for _, post_id in keys])
+        date_key, id_key = ENTRY_KEYS
+        rows = []
+        for pub_date, post_id in keys:
+            post = posts.get(post_id)
+            if post is None:
+                # Пост удалён между двумя запросами.
+                continue
+            setattr(post, date_key, pub_date)
+            setattr(post, id_key, post_id)
+            rows.append(post)
+        return rows
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя, от новых к старым.
+
+    Если среди подписок нет «гибридных» авторов, посты читаются через
+    индекс ленты (user, -pub_date, -post) уже в нужном порядке. Иначе
+    вернёт HybridTimeline. Для курсорной пагинации передайте paginate()
+    keys=ENTRY_KEYS.
+    """
+
+    date_key, id_key = ENTRY_KEYS
+    authors = list(hybrid_authors(user).values_list('author_id', flat=True))
+    if authors:
+        # Записи о постах гибридных авторов могли остаться с тех пор,
+        # как автор был обычным: эти посты придут из его потока.
+        entries = TimelineEntry.objects.filter(user=user).exclude(
+            author_id__in=authors,
+        ).annotate(**{
+            date_key: F('pub_date'), id_key: F('post_id'),
+        })
+        return HybridTimeline([entries, *(
+            Post.objects.filter(author_id=author_id).annotate(**{
+                date_key: F('pub_date'), id_key: F('pk'),
+            })
+            for author_id in authors
+        )])
+    posts = Post.objects.filter(timeline_entries__user=user).annotate(**{
+        date_key: F('timeline_entries__pub_date'),
+        id_key: F('timeline_entries__post_id'),
+    })
+    return posts.order_by(f'-{date_key}', f'-{id_key}')
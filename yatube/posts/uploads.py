@@ -0,0 +1,144 @@
+"""Потоковый приём картинок постов.
+
+ImageUploadHandler пишет файл на диск по мере прихода байтов и проверяет
+его на лету: размер - по каждому куску, формат и число пикселей - по
+заголовку, как только он пришёл целиком. Картинка, превышающая лимиты,
+отбрасывается, не дочитываясь до конца, а слишком большая по сторонам
+уменьшается до POST_IMAGE_MAX_SIDE до того, как попадёт в MEDIA_ROOT.
+Ошибка показывается в форме у поля картинки.
+"""
+import functools
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+FIELD_NAME = 'image'
+FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# Заголовок, который нашёлся не раньше этого числа байт, считается
+# испорченным: у JPEG размеры стоят после EXIF, но не дальше 64 КБ.
+HEADER_LIMIT = 256 * 1024
+
+# Уменьшение декодирует картинку целиком, поэтому одновременно его
+# делают не больше POST_IMAGE_RESIZE_CONCURRENCY потоков процесса.
+_resize_slots = threading.BoundedSemaphore(
+    settings.POST_IMAGE_RESIZE_CONCURRENCY)
+
+
+def _mb(size):
+    return f'{size / 1024 / 1024:.0f} МБ'
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Обработчик загрузки поля image с лимитами и уменьшением."""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+        self.file = None
+
+    def reject(self, error):
+        self.error = error
+        raise SkipFile(error)
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        if field_name != FIELD_NAME:
+            raise SkipFile
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra)
+        self.size = 0
+        self.header = BytesIO()
+        self.image_size = None
+        self.format = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.reject(f'Файл больше '
+                        f'{_mb(settings.POST_IMAGE_MAX_UPLOAD_SIZE)}.')
+        if self.image_size is None:
+            self.header.write(raw_data)
+            self.check_header(complete=False)
+        self.file.write(raw_data)
+
+    def check_header(self, complete):
+        try:
+            with Image.open(BytesIO(self.header.getvalue())) as image:
+                width, height = image.size
+                self.format = image.format
+        except Exception:
+            if complete or self.header.tell() > HEADER_LIMIT:
+                self.reject('Загрузите картинку в формате '
+                            f'{", ".join(FORMATS)}.')
+            return
+        if self.format not in FORMATS:
+            self.reject(f'Загрузите картинку в формате {", ".join(FORMATS)}.')
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            self.reject(f'Картинка больше '
+                        f'{settings.POST_IMAGE_MAX_PIXELS // 10 ** 6} '
+                        f'мегапикселей.')
+        self.image_size = (width, height)
+        self.header = None
+
+    def file_complete(self, file_size):
+        if self.image_size is None:
+            try:
+                self.check_header(complete=True)
+            except SkipFile:
+                # Отсюда SkipFile уже не ловится: файл просто не отдаём.
+                self.file.close()
+                return None
+        self.file.seek(0)
+        self.file.size = file_size
+        if max(self.image_size) > settings.POST_IMAGE_MAX_SIDE:
+            with _resize_slots:
+                self.file = self.downscale(self.file)
+        return self.file
+
+    def downscale(self, upload):
+        side = settings.POST_IMAGE_MAX_SIDE
+        with Image.open(upload) as image:
+            # Для JPEG draft декодирует сразу в уменьшенном масштабе.
+            image.draft('RGB', (side, side))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((side, side), Image.LANCZOS)
+            result = TemporaryUploadedFile(
+                upload.name, upload.content_type, 0, upload.charset,
+                upload.content_type_extra)
+            image.save(result, self.format, quality=90)
+        upload.close()
+        result.size = result.tell()
+        result.seek(0)
+        return result
+
+
+def upload_error(request):
+    """Ошибка загрузки картинки в этом запросе или None."""
+
+    for handler in request.upload_handlers:
+        if isinstance(handler, ImageUploadHandler):
+            return handler.error
+    return None
+
+
+def stream_image_uploads(view):
+    """Принимает картинки во view через ImageUploadHandler.
+
+    Обработчики загрузки нужно заменить до того, как CsrfViewMiddleware
+    прочитает request.POST, поэтому проверка CSRF переносится внутрь.
+    """
+
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
@@ -2,17 +2,20 @@ from django.urls import path
 
 from posts.views import (add_comment, follow_index, group_posts, index,
                          post_create, post_edit, post_view, profile,
-                         profile_follow, profile_unfollow)
+                         profile_follow, profile_unfollow, resized_image,
+                         search_posts, tag_page)
 
 app_name = 'posts'
 urlpatterns = [
     path('', index, name='index'),
     path('group/<slug:slug>/', group_posts, name='group_list'),
+    path('tag/<str:name>/', tag_page, name='tag'),
     path('profile/<str:username>/', profile, name='profile'),
     path('posts/<int:post_id>/', post_view, name='post_detail'),
     path('create/', post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', add_comment, name='add_comment'),
+    path('search/', search_posts, name='search'),
     path('follow/', follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
@@ -24,4 +27,9 @@ urlpatterns = [
         profile_unfollow,
         name="profile_unfollow"
     ),
+    path(
+        'media/resize/<int:width>x<int:height>/<path:path>',
+        resized_image,
+        name='resize'
+    ),
 ]
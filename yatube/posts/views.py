@@ -2,36 +2,49 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.core.paginator import Paginator
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_GET
 
+from core.db_router import on_replica, read_primary
+from core.page_cache import add_surrogate_keys, cache_page_for_anonymous
 from posts.forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post
+from . import archive, resize, search, thumbnails
+from .cache import index_version, page_key
+from .counters import get_stats
+from .models import Follow, Group, Post, Tag
+from .paginators import ENTRY_KEYS, paginate
+from .tags import tag_posts
+from .timeline import timeline_posts
+from .uploads import stream_image_uploads, upload_error
 
 User = get_user_model()
 
 
+@cache_page_for_anonymous('index')
+# Фрагмент ленты хранится в общем кэше, его нельзя собирать по реплике.
+@read_primary()
 def index(request):
     """View - функция для главной страницы проекта."""
 
-    posts = Post.objects.all().select_related("group")
-    paginator = Paginator(posts, settings.PAGINATOR)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.for_feed()
+    page_obj = paginate(request, posts, 'posts:index')
     context = {
         'page_obj': page_obj,
+        'cache_timeout': settings.INDEX_CACHE_TIMEOUT,
+        'cache_version': index_version(),
+        'cache_page': page_key(page_obj),
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_page_for_anonymous('group:{slug}')
 def group_posts(request, slug):
     """View - функция для страницы с постами, отфильтрованными по группам."""
 
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group)
-    paginator = Paginator(posts, settings.PAGINATOR)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = archive.with_archive(group.posts.for_feed())
+    page_obj = paginate(request, posts, 'posts:group_list')
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -41,24 +54,44 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_page_for_anonymous('tag:{name}')
+def tag_page(request, name):
+    """View - функция для страницы с постами одного хэштега."""
+
+    if name != name.lower():
+        # Страница кэшируется по имени из url, а сбрасывается по имени тега.
+        return redirect('posts:tag', name.lower())
+    tag = get_object_or_404(Tag, name=name)
+    posts = tag_posts(tag).for_feed()
+    page_obj = paginate(request, posts, 'posts:tag', ENTRY_KEYS)
+    context = {
+        'tag': tag,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/tag.html', context)
+
+
+@cache_page_for_anonymous('author:{username}')
 def profile(request, username):
     """View - функция для страницы с постами пользователя,
        вошедшего на сайт.
     """
 
-    author = get_object_or_404(User, username=username)
-
-    count = author.posts.all().count()
-    paginator = Paginator(author.posts.all(), settings.PAGINATOR)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    stats = get_stats(author)
+    # Автор прочитан из основной базы, его посты - с реплики.
+    posts = on_replica(author.posts.for_profile())
+    page_obj = paginate(request, archive.with_archive(posts),
+                        'posts:profile')
     following = (
         request.user.is_authenticated
-        and author.following.filter(user=request.user).exists()
+        and on_replica(author.following.filter(user=request.user)).exists()
     )
 
     context = {'author': author,
-               'count': count,
+               'count': stats.posts_count,
+               'stats': stats,
                'page_obj': page_obj,
                'following': following,
 
@@ -66,32 +99,53 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@cache_page_for_anonymous('post:{post_id}')
 def post_view(request, post_id):
     """View - функция для страницы определенного поста."""
 
-    post = get_object_or_404(Post, pk=post_id)
-    count = Post.objects.filter(author=post.author).count()
+    post = archive.get_post(Post.objects.for_detail(), post_id)
+    add_surrogate_keys(request, f'author:{post.author.username}')
+    if post.group is not None:
+        add_surrogate_keys(request, f'group:{post.group.slug}')
+    count = get_stats(post.author).posts_count
     form = CommentForm()
-    comment = Comment.objects.filter(post=post.pk)
+    comment = post.comments.all()
 
     context = {'post': post,
                'count': count,
                'form': form,
                'comment': comment,
+               'archived': archive.is_archived(post),
                }
     return render(request, 'posts/post_detail.html', context)
 
 
+def search_posts(request):
+    """View - функция для поиска по постам и комментариям."""
+
+    query = request.GET.get('q', '').strip()
+    paginator = search.SearchPaginator(Post.objects.for_feed(), query,
+                                       settings.PAGINATOR)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('after')),
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@stream_image_uploads
 def post_create(request):
     """View - функция для создания поста."""
 
     if request.method == 'POST':
-        form = PostForm(request.POST, files=request.FILES or None)
+        form = PostForm(request.POST, files=request.FILES or None,
+                        upload_error=upload_error(request))
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            thumbnails.enqueue(post.image)
             return redirect('posts:profile', request.user.username)
         return render(request, 'posts/create_post.html', {"form": form})
     form = PostForm()
@@ -99,6 +153,7 @@ def post_create(request):
 
 
 @login_required
+@stream_image_uploads
 def post_edit(request, post_id):
     """View - функция для редактирования проекта."""
 
@@ -111,9 +166,12 @@ def post_edit(request, post_id):
     else:
         form = PostForm(request.POST or None,
                         files=request.FILES or None,
-                        instance=post)
+                        instance=post,
+                        upload_error=upload_error(request))
         if form.is_valid():
             post = form.save()
+            if 'image' in form.changed_data:
+                thumbnails.enqueue(post.image)
             return redirect('posts:post_detail', post_id)
     return render(request, 'posts/create_post.html',
                   {"form": form, 'post': post, "is_edit": is_edit, })
@@ -135,10 +193,9 @@ def add_comment(request, post_id):
 def follow_index(request):
     """View - функция для главной страницы подписок."""
 
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, settings.PAGINATOR)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = timeline_posts(request.user).for_feed()
+    page_obj = paginate(request, posts, 'posts:follow_index',
+                        ENTRY_KEYS)
     context = {
         'page_obj': page_obj,
     }
@@ -160,7 +217,28 @@ def profile_unfollow(request, username):
     """Отписаться от автора."""
 
     author = get_object_or_404(User, username=username)
-    follow = get_object_or_404(Follow, author=author,
-                               user=request.user)
+    # Сигналы удаления берут имена пользователей из связей подписки.
+    follow = get_object_or_404(Follow.objects.select_related('user',
+                                                             'author'),
+                               author=author, user=request.user)
     follow.delete()
     return redirect('posts:profile', username=username)
+
+
+@require_GET
+def resized_image(request, width, height, path):
+    """Картинка поста, уменьшенная по подписанной ссылке."""
+
+    max_size = settings.RESIZE_MAX_DIMENSION
+    if not (0 < width <= max_size and 0 < height <= max_size):
+        raise Http404
+    if not resize.check_signature(width, height, path,
+                                  request.GET.get('s')):
+        raise Http404
+    image = resize.open_resized(path, width, height)
+    if image is None:
+        raise Http404
+    response = FileResponse(image)
+    # Ссылка подписана и указывает на неизменный результат.
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
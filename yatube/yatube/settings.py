@@ -27,6 +27,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.query_budget.QueryBudgetMiddleware',
+    'core.db_router.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,7 +67,59 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # Соединение живёт между запросами: PRAGMA из SQLITE_PRAGMAS
+        # выполняются один раз, а кэш страниц SQLite не теряется.
+        'CONN_MAX_AGE': 600,
+    },
+    # Локальная реплика: копия db.sqlite3, которую обновляет
+    # manage.py sync_replica --interval 5. В тестах это та же база.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'TEST': {'MIRROR': 'default'},
+    },
+    # Архив старых постов (posts.archive): отдельная база со всей
+    # схемой, manage.py migrate --database archive.
+    'archive': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.archive.sqlite3'),
+        'CONN_MAX_AGE': 600,
+    },
+}
+
+# Чтение лент в GET-запросах идёт на реплики (core.db_router). Пустой
+# список - всё читается из основной базы; для локальной реплики задайте
+# ('replica',) и запустите sync_replica.
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+REPLICA_DATABASES = ()
+REPLICA_MODELS = ('posts.post', 'posts.group', 'posts.comment',
+                  'posts.follow')
+# После записи через эти страницы посетитель читает из основной базы,
+# пока жива cookie; срок должен быть больше отставания реплики.
+REPLICA_STICKY_VIEWS = ('posts:post_create', 'posts:post_edit',
+                        'posts:add_comment', 'posts:profile_follow',
+                        'posts:profile_unfollow')
+REPLICA_STICKY_COOKIE = 'read_primary'
+REPLICA_STICKY_SECONDS = 30
+
+# Посты старше ARCHIVE_AFTER_DAYS с комментариями переносит в базу
+# ARCHIVE_DATABASE команда archive_posts. None - архив выключен.
+ARCHIVE_DATABASE = None
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 500
+
+# PRAGMA для каждого нового соединения с SQLite (core.sqlite). WAL
+# разрешает читать во время записи; synchronous=NORMAL в режиме WAL
+# не теряет согласованность, только последние транзакции при сбое
+# питания. cache_size в отрицательных значениях задаётся в КБ.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
 }
 
 
@@ -106,15 +160,142 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 PAGINATOR = 10
+# Режим пагинации для каждой ленты: 'numbered' (?page=) или 'cursor'
+# (?after=/?before=). Курсорный режим не делает COUNT(*) и OFFSET.
+PAGINATOR_MODE = {
+    'posts:index': 'numbered',
+    'posts:group_list': 'numbered',
+    'posts:tag': 'numbered',
+    'posts:profile': 'numbered',
+    'posts:follow_index': 'numbered',
+}
+
+# Посты авторов, у которых подписчиков больше этого числа, не раскладываются
+# по лентам при публикации, а подмешиваются в follow_index при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Фрагмент ленты на главной хранится долго: при изменении постов,
+# комментариев и групп сигналы меняют версию в его ключе.
+INDEX_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Кэш целых страниц для анонимных посетителей (core.page_cache). Тесты,
+# которым нужна свежая страница на каждый запрос, выключают его сами.
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Бюджет SQL-запросов на страницу (core.query_budget). Страницы из
+# QUERY_BUDGET_NAMESPACES, сделавшие больше запросов, чем указано здесь
+# (или в QUERY_BUDGET_DEFAULT), либо повторившие один запрос больше
+# QUERY_BUDGET_REPEAT_LIMIT раз, попадают в лог, а в тестах роняют тест.
+# Выключено: тесты включают проверку сами (core.pytest_plugin).
+QUERY_BUDGET_ENABLED = False
+QUERY_BUDGET_NAMESPACES = ('posts', 'users')
+QUERY_BUDGET_DEFAULT = 10
+QUERY_BUDGET_REPEAT_LIMIT = 2
+# Страница автора или группы, дочитывающая ленту из архива, делает в нём
+# ещё два запроса: число архивных постов и их срез.
+QUERY_BUDGET_ARCHIVE = 2
+# Бюджеты - наибольшее число запросов страницы для вошедшего посетителя;
+# сессия и пользователь - это всегда первые два запроса.
+QUERY_BUDGETS = {
+    # COUNT для пагинатора и срез страницы.
+    'posts:index': 4,
+    # Плюс группа или тег.
+    'posts:group_list': 5,
+    'posts:tag': 5,
+    # Ключи страницы из FTS5 и посты по ним.
+    'posts:search': 4,
+    # Гибридные авторы, COUNT, ключи страницы и посты по ним.
+    'posts:follow_index': 6,
+    # Автор, его счётчики, подписка, COUNT и срез. При первом просмотре
+    # счётчики создаются (posts.counters.create_stats): ещё четыре COUNT
+    # и вставка вместо чтения.
+    'posts:profile': 8,
+    # Пост с автором, счётчики, комментарии и проверка подписки.
+    'posts:post_detail': 6,
+    # Группа из формы и проверка ключа, вставка поста, теги, счётчик,
+    # раскладка по лентам подписчиков; для первого поста автора ещё
+    # создание его счётчиков.
+    'posts:post_create': 15,
+    # Пост и его автор, группа из формы и проверка ключа, прежние группа
+    # и картинка, ссылки на старую картинку и сохранение.
+    'posts:post_edit': 10,
+    'posts:add_comment': 5,
+    # Подписка, два счётчика и раскладка постов автора в ленту; если
+    # счётчиков автора и подписчика ещё нет, они создаются.
+    'posts:profile_follow': 17,
+    'posts:profile_unfollow': 10,
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Размеры миниатюр, которые используют шаблоны: имя -> (геометрия, опции
+# sorl-thumbnail). Миниатюры создаются в фоне при загрузке картинки
+# (posts.thumbnails), страница до этого показывает оригинал.
+THUMBNAIL_GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_WORKERS = 2
+# Миниатюры создаются в пуле потоков. Тесты включают синхронный режим
+# через override_settings: фоновый поток не переживёт тест, который
+# удаляет MEDIA_ROOT.
+THUMBNAIL_BACKGROUND = True
+# Картинку, для которой не удалось создать миниатюры, столько секунд не
+# ставят в очередь снова, а страницы показывают оригинал.
+THUMBNAIL_FAILURE_TIMEOUT = 60 * 60
+# Варианты миниатюр для srcset: ширины и современные форматы. Форматы,
+# которые не умеет записывать установленный Pillow, пропускаются.
+THUMBNAIL_SRCSET_WIDTHS = (480, 960)
+THUMBNAIL_SRCSET_FORMATS = ('AVIF', 'WEBP')
+# Картинки ниже первой грузятся лениво, а до загрузки на их месте видна
+# размытая заглушка. Выключается для сравнения в benchmark_page_weight.
+POST_IMAGE_LAZY = True
+
+# Уменьшение картинок по подписанной ссылке /media/resize/<w>x<h>/<path>
+# (posts.resize). Результаты хранятся на диске, при превышении размера
+# кэша вытесняются давно не запрошенные.
+RESIZE_CACHE_DIR = os.path.join(BASE_DIR, 'resize_cache')
+RESIZE_CACHE_MAX_SIZE = 512 * 1024 * 1024
+# Переполнение кэша проверяется после каждых стольких созданных картинок:
+# обход каталога кэша дороже одного уменьшения.
+RESIZE_EVICT_EVERY = 100
+RESIZE_MAX_DIMENSION = 2000
+
+# Лимиты загрузки картинок постов (posts.uploads). Проверяются по мере
+# прихода байтов; картинка больше POST_IMAGE_MAX_SIDE по любой стороне
+# уменьшается до сохранения.
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_RESIZE_CONCURRENCY = 2
+
+# Кэш в файле SQLite общий для всех WSGI-процессов хоста: версии фрагментов
+# и суррогатных ключей, изменённые в одном процессе, видны остальным.
+# Перед ним стоит небольшой LRU в памяти процесса; его записи сбрасываются
+# через шину инвалидации в общем кэше (core.cache_backends.TwoLevelCache).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.TwoLevelCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 512,
+            'L1_TIMEOUT': 5,
+            'BUS_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'MAX_SIZE': 64 * 1024 * 1024,
+        },
     }
 }
 
+# Тесты работают с кэшами в памяти, а не с файлом кэша сайта.
+TEST_RUNNER = 'core.testing.TestRunner'
+
 if DEBUG:
     INTERNAL_IPS = type(str('c'), (), {'__contains__': lambda *a: True})()